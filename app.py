@@ -1,11 +1,22 @@
 """
 Main Streamlit application for CSV RAG Chat App.
 """
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
+import atexit
+import hashlib
+import io
+import logging
 import os
+import re
+import shutil
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -14,17 +25,445 @@ project_root = Path(__file__).parent
 env_path = project_root / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Add project root to path (already defined above)
-sys.path.append(str(project_root))
+# Debug tracing of the chat path; enable with LOG_LEVEL=DEBUG
+log_level = os.getenv("LOG_LEVEL", "WARNING").upper()
+# getLevelName maps known names to their number; an unknown name would
+# make basicConfig raise and the app fail to start, so fall back to WARNING
+known_level = isinstance(logging.getLevelName(log_level), int)
+logging.basicConfig(level=log_level if known_level else logging.WARNING)
+logger = logging.getLogger(__name__)
+if not known_level:
+    logger.warning("Unknown LOG_LEVEL %r, using WARNING", log_level)
+
+# Add project root to path (already defined above); the script re-runs on
+# every interaction, so only add it once
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+# Heavy modules (pandas/pyarrow, the query engine, sentence-transformers) are
+# imported inside the code paths that need them so the first page render
+# doesn't wait on them
+if TYPE_CHECKING:
+    import pandas as pd
+    from data_ingestion.csv_to_neo4j import CSVToNeo4j
+    from query_engine.query_parser import QueryParser
+    from query_engine.retriever import Retriever
+    from query_engine.response_builder import ResponseBuilder
+    from utils.embeddings import EmbeddingGenerator
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _preview_csv(file_id: str, _file_bytes: bytes, nrows: int = 10) -> tuple:
+    """
+    Build the sidebar preview of an uploaded CSV in a single streaming pass.
+    
+    Parsed straight from the in-memory upload and cached on the upload's
+    file_id (the bytes themselves are not hashed), so reruns reuse it.
+    
+    Returns:
+        Tuple of (first ``nrows`` rows as a DataFrame, row count, column count)
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    head = None
+    try:
+        # pandas' pyarrow engine doesn't support nrows, so take the head from
+        # the first Arrow batch and only count rows in the rest
+        reader = pacsv.open_csv(
+            pa.BufferReader(_file_bytes),
+            read_options=pacsv.ReadOptions(block_size=1 << 20)
+        )
+        num_rows = 0
+        for batch in reader:
+            if head is None:
+                head = batch.slice(0, nrows).to_pandas(types_mapper=pd.ArrowDtype)
+            num_rows += batch.num_rows
+        if head is None:
+            head = reader.schema.empty_table().to_pandas(types_mapper=pd.ArrowDtype)
+        return head, num_rows, len(reader.schema)
+    except pa.ArrowInvalid:
+        if head is None:
+            # Fall back to the C engine for files pyarrow can't parse
+            head = pd.read_csv(
+                io.BytesIO(_file_bytes),
+                nrows=nrows,
+                engine="c",
+                low_memory=False,
+                cache_dates=True
+            )
+        # Types inferred from the first block didn't hold for a later one
+        num_rows, num_cols = _csv_shape(_file_bytes)
+        return head, num_rows, num_cols
+
+
+def _csv_shape(file_bytes: bytes) -> tuple:
+    """Count rows and columns of a CSV, reading every column as string."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    # Read every column as string so later blocks can't fail type inference
+    header = pacsv.open_csv(pa.BufferReader(file_bytes)).schema
+    reader = pacsv.open_csv(
+        pa.BufferReader(file_bytes),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header.names}
+        )
+    )
+    num_rows = sum(batch.num_rows for batch in reader)
+    return num_rows, len(header)
+
+
+@st.cache_resource
+def get_embedder() -> EmbeddingGenerator:
+    """Load the embedding model once per process, shared by all sessions."""
+    from utils.embeddings import EmbeddingGenerator
+    return EmbeddingGenerator()
+
+
+@st.cache_resource
+def get_neo4j_driver():
+    """One pooled Neo4j driver per process, shared by all sessions."""
+    from database.neo4j_client import create_driver
+    return create_driver()
+
+
+@st.cache_resource
+def get_milvus_client():
+    """One Milvus connection and loaded collection per process, shared by all sessions."""
+    from database.milvus_client import MilvusClient
+    return MilvusClient()
+
+
+@st.cache_resource
+def get_query_parser() -> QueryParser:
+    """Shared query parser instance."""
+    from query_engine.query_parser import QueryParser
+    return QueryParser()
+
+
+@st.cache_resource
+def get_response_builder() -> ResponseBuilder:
+    """Shared response builder (and OpenAI client) instance."""
+    from query_engine.response_builder import ResponseBuilder
+    return ResponseBuilder()
+
+
+def _normalize_query(query: str) -> str:
+    """Normalize a query for use as a cache key (case and whitespace insensitive)."""
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def _cached_retrieve(norm_query: str, top_k: int, similarity_threshold: float,
+                     _query: str, _query_parser: QueryParser, _retriever: Retriever,
+                     _response_builder: ResponseBuilder) -> tuple:
+    """
+    Parse, retrieve and build the LLM context for a query, memoized on the
+    normalized query text.
+    
+    Underscore-prefixed arguments are not hashed by Streamlit, so repeat
+    questions that differ only in case/spacing reuse the first result,
+    including the assembled context and PDF URLs (they depend only on the
+    retrieval results). Cleared after every successful ingestion.
+    
+    Returns:
+        Tuple of (parsed query, retrieval results, context, PDF URLs)
+    """
+    parsed_query = _query_parser.parse(_query)
+    retrieval_results = _retriever.retrieve(
+        parsed_query,
+        top_k=top_k,
+        similarity_threshold=similarity_threshold
+    )
+    context, pdf_urls = _response_builder.build_context_and_urls(
+        retrieval_results.get('neo4j_results', {}),
+        retrieval_results.get('milvus_results', []),
+        retrieval_results.get('query_intent', 'general')
+    )
+    return parsed_query, retrieval_results, context, pdf_urls
+
+
+# Number of chat messages rendered outside the "Earlier messages" expander
+RECENT_HISTORY = 20
+
+
+def _render_message(message: dict) -> None:
+    """Render one conversation history entry as a chat message."""
+    role = message.get('role', 'user')
+    content = message.get('content', '')
+    
+    if role == 'user':
+        with st.chat_message("user"):
+            st.write(content)
+    else:
+        with st.chat_message("assistant"):
+            # PDF URLs are integrated within the response text itself
+            st.markdown(content)
+
+
+def _get_db_stats(max_age: float = 30.0) -> dict:
+    """Return Neo4j stats, re-querying at most once every ``max_age`` seconds per session."""
+    cached = st.session_state.get('db_stats')
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+    stats = st.session_state.neo4j_client.get_database_stats()
+    st.session_state.db_stats = (time.monotonic(), stats)
+    return stats
+
+
+def _get_milvus_stats(max_age: float = 30.0) -> dict:
+    """Return Milvus collection stats, re-querying at most once every ``max_age`` seconds per session."""
+    cached = st.session_state.get('milvus_stats')
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+    stats = st.session_state.milvus_client.get_collection_stats()
+    st.session_state.milvus_stats = (time.monotonic(), stats)
+    return stats
 
-from data_ingestion.csv_to_neo4j import CSVToNeo4j
-from data_ingestion.pdf_to_milvus import PDFToMilvus
-from database.neo4j_client import Neo4jClient
-from database.milvus_client import MilvusClient
-from query_engine.query_parser import QueryParser
-from query_engine.retriever import Retriever
-from query_engine.response_builder import ResponseBuilder
-from utils.embeddings import EmbeddingGenerator
+
+def _upload_temp_dir(size: int) -> str:
+    """Prefer tmpfs (/dev/shm) for uploads when it is writable and has room for the file."""
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        vfs = os.statvfs(shm)
+        # Keep headroom: container /dev/shm is often only 64 MB
+        if vfs.f_bavail * vfs.f_frsize > 2 * size:
+            return shm
+    return tempfile.gettempdir()
+
+
+def _save_upload(uploaded_file, upload: dict) -> str:
+    """Write the upload to a temp file (once per upload) and return its path."""
+    temp_path = upload.get('path')
+    if temp_path and os.path.exists(temp_path):
+        return temp_path
+    
+    # A unique file per upload: sessions uploading files with the same name
+    # must not overwrite (or delete) each other's copy mid-ingestion
+    fd, temp_path = tempfile.mkstemp(dir=_upload_temp_dir(uploaded_file.size), suffix='.csv')
+    _upload_temp_files().add(temp_path)
+    # Stream to disk in 1 MB blocks instead of copying the whole buffer
+    uploaded_file.seek(0)
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, length=1 << 20)
+    # Rewind so later reads of the upload start from the beginning
+    uploaded_file.seek(0)
+    upload['path'] = temp_path
+    return temp_path
+
+
+def _discard_upload(temp_path: str, temp_files: set):
+    """
+    Delete an upload's temp file once it has been ingested (tmpfs is RAM).
+    
+    Runs on the worker pool, so the registry from _upload_temp_files() is
+    passed in rather than looked up from the Streamlit cache.
+    """
+    temp_files.discard(temp_path)
+    try:
+        os.unlink(temp_path)
+    except OSError:
+        pass
+
+
+@st.cache_resource
+def _upload_temp_files() -> set:
+    """Process-wide set of uploaded temp files, removed at interpreter exit (backstop for _discard_upload)."""
+    paths = set()
+    
+    def _cleanup():
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    
+    atexit.register(_cleanup)
+    return paths
+
+
+@st.cache_resource
+def _ingest_executor() -> ThreadPoolExecutor:
+    """
+    Shared worker pool so ingestion runs off the Streamlit script thread.
+    
+    One pool per server process, shared by all sessions: it lives as long as
+    the process (idle workers cost nothing) and is shut down at interpreter
+    exit, cancelling ingestions that have not started yet.
+    """
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ingest')
+    atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+    return executor
+
+
+# Uploads larger than this are streamed in chunks instead of loaded whole
+STREAM_CSV_BYTES = 256 * 1024 * 1024
+STREAM_CHUNK_ROWS = 50000
+
+
+def _run_ingestion(neo4j_client, milvus_client, embedding_generator, csv_path: str, clear_existing: bool,
+                   temp_files: set) -> CSVToNeo4j:
+    """Build the ingestion pipeline and run it (executed on the worker pool); ``csv_path`` is deleted afterwards."""
+    from data_ingestion.csv_to_neo4j import CSVToNeo4j
+    from data_ingestion.pdf_to_milvus import PDFToMilvus
+    
+    # Initialize PDF processor if Milvus is available
+    pdf_processor = None
+    if milvus_client:
+        pdf_processor = PDFToMilvus(
+            milvus_client=milvus_client,
+            embedding_generator=embedding_generator
+        )
+    
+    converter = CSVToNeo4j(neo4j_client, pdf_processor=pdf_processor)
+    try:
+        converter.ingest_csv(
+            csv_path,
+            clear_existing=clear_existing,
+            process_pdfs=(pdf_processor is not None),
+            chunksize=STREAM_CHUNK_ROWS if os.path.getsize(csv_path) > STREAM_CSV_BYTES else None
+        )
+    finally:
+        # Re-ingesting the same upload writes it out again (see _save_upload)
+        _discard_upload(csv_path, temp_files)
+    return converter
+
+
+@st.fragment
+def _chat_fragment():
+    """
+    Chat UI (history, input, streaming answer).
+    
+    Runs as a fragment so sending a message reruns only this block,
+    not the sidebar and connection/status code above it.
+    """
+    # Chat Interface
+    st.subheader("💬 Chat Interface")
+    st.markdown("Ask questions about parts, models, or equipment. The system will search both structured data and PDF manuals.")
+    
+    # Display conversation history
+    if st.session_state.conversation_history:
+        st.markdown("### Conversation History")
+        # Render only the most recent turns so per-rerun work stays bounded
+        history = st.session_state.conversation_history
+        if len(history) > RECENT_HISTORY:
+            with st.expander(f"Earlier messages ({len(history) - RECENT_HISTORY})"):
+                for message in history[:-RECENT_HISTORY]:
+                    _render_message(message)
+        for message in history[-RECENT_HISTORY:]:
+            _render_message(message)
+    
+    # Chat input
+    user_query = st.chat_input("Ask a question about parts or models...")
+    
+    if user_query:
+        # Add user message to history
+        st.session_state.conversation_history.append({
+            'role': 'user',
+            'content': user_query
+        })
+        
+        # Process query
+        if st.session_state.query_parser and st.session_state.retriever and st.session_state.response_builder:
+            with st.spinner("Processing your query..."):
+                try:
+                    debug = logger.isEnabledFor(logging.DEBUG)
+                    if debug:
+                        logger.debug("USER QUERY: %s", user_query)
+                    
+                    # Parse query, retrieve data and build the context (cached for repeat questions)
+                    parsed_query, retrieval_results, context, pdf_urls = _cached_retrieve(
+                        _normalize_query(user_query),
+                        5,
+                        0.7,
+                        user_query,
+                        st.session_state.query_parser,
+                        st.session_state.retriever,
+                        st.session_state.response_builder
+                    )
+                    if debug:
+                        logger.debug(
+                            "Parsed query: intent=%s parts=%s models=%s",
+                            parsed_query.get('intent'),
+                            parsed_query.get('parts_town_numbers'),
+                            parsed_query.get('model_names')
+                        )
+                    
+                    if debug:
+                        logger.debug(
+                            "Retrieval results: neo4j parts=%d models=%d, milvus chunks=%d",
+                            len(retrieval_results.get('neo4j_results', {}).get('parts', [])),
+                            len(retrieval_results.get('neo4j_results', {}).get('models', [])),
+                            len(retrieval_results.get('milvus_results', []))
+                        )
+                    
+                    query_intent = retrieval_results.get('query_intent', 'general')
+                    
+                    # Stream the response in real-time
+                    with st.chat_message("assistant"):
+                        response_placeholder = st.empty()
+                        
+                        # Get streaming generator
+                        stream_generator = st.session_state.response_builder.generate_streaming_response(
+                            user_query=user_query,
+                            context=context,
+                            # Only the window the builder sends, not a copy of the whole history
+                            conversation_history=st.session_state.conversation_history[
+                                -(st.session_state.response_builder.history_window + 1):-1
+                            ],
+                            query_intent=query_intent
+                        )
+                        
+                        # Stream the response, re-rendering every 16 chunks or 50 ms
+                        # rather than once per token; StringIO keeps appends linear
+                        buffer = io.StringIO()
+                        pending = 0
+                        last_flush = time.monotonic()
+                        for chunk in stream_generator:
+                            buffer.write(chunk)
+                            pending += 1
+                            if pending >= 16 or time.monotonic() - last_flush > 0.05:
+                                pending = 0
+                                response_placeholder.markdown(buffer.getvalue() + "▌")  # Cursor effect
+                                last_flush = time.monotonic()
+                        full_response = buffer.getvalue()
+                        
+                        # Final response without cursor
+                        response_placeholder.markdown(full_response)
+                    
+                    if debug:
+                        logger.debug("Response completed: %d PDF URLs", len(pdf_urls))
+                    
+                    # Add assistant response to history
+                    st.session_state.conversation_history.append({
+                        'role': 'assistant',
+                        'content': full_response,
+                        'pdf_urls': pdf_urls,
+                        'sources': []
+                    })
+                    
+                    # Force rerun to update the display
+                    st.rerun(scope="fragment")
+                
+                except Exception as e:
+                    error_msg = f"I encountered an error processing your query: {str(e)}"
+                    st.session_state.conversation_history.append({
+                        'role': 'assistant',
+                        'content': error_msg
+                    })
+                    st.error(error_msg)
+                    st.exception(e)
+                    st.rerun(scope="fragment")
+        else:
+            st.error("Query engine not initialized. Please check your database connections.")
+    
+    # Clear conversation button
+    if st.session_state.conversation_history:
+        if st.button("🗑️ Clear Conversation"):
+            st.session_state.conversation_history = []
+            st.rerun(scope="fragment")
 
 
 st.set_page_config(
@@ -54,7 +493,8 @@ if not st.session_state.connection_attempted:
     st.session_state.connection_attempted = True
     try:
         # Connect to Neo4j using environment variables only
-        st.session_state.neo4j_client = Neo4jClient()
+        from database.neo4j_client import Neo4jClient
+        st.session_state.neo4j_client = Neo4jClient(driver=get_neo4j_driver())
         st.session_state.connection_error = None
     except Exception as e:
         st.session_state.connection_error = str(e)
@@ -62,7 +502,7 @@ if not st.session_state.connection_attempted:
     
     # Try to connect to Milvus (optional, won't fail if not available)
     try:
-        st.session_state.milvus_client = MilvusClient()
+        st.session_state.milvus_client = get_milvus_client()
     except Exception as e:
         st.session_state.milvus_client = None
         # Don't set error, Milvus is optional
@@ -70,30 +510,31 @@ if not st.session_state.connection_attempted:
     # Initialize query engine components if databases are connected
     if st.session_state.neo4j_client:
         try:
-            st.session_state.query_parser = QueryParser()
+            from query_engine.retriever import Retriever
+            st.session_state.query_parser = get_query_parser()
             # Initialize retriever with embedding generator if Milvus is available
             embedding_gen = None
             if st.session_state.milvus_client:
-                embedding_gen = EmbeddingGenerator()
+                embedding_gen = get_embedder()
             st.session_state.retriever = Retriever(
                 neo4j_client=st.session_state.neo4j_client,
                 milvus_client=st.session_state.milvus_client,
                 embedding_generator=embedding_gen
             )
-            st.session_state.response_builder = ResponseBuilder()
+            st.session_state.response_builder = get_response_builder()
         except Exception as e:
             st.warning(f"Could not initialize query engine: {e}")
     
     # Check if databases have data (only once)
     if not st.session_state.databases_checked and st.session_state.neo4j_client:
         try:
-            neo4j_stats = st.session_state.neo4j_client.get_database_stats()
+            neo4j_stats = _get_db_stats()
             neo4j_has_data = neo4j_stats.get('total_nodes', 0) > 0
             
             milvus_has_data = False
             if st.session_state.milvus_client:
                 try:
-                    milvus_stats = st.session_state.milvus_client.get_collection_stats()
+                    milvus_stats = _get_milvus_stats()
                     milvus_has_data = milvus_stats.get('entity_count', 0) > 0
                 except:
                     milvus_has_data = False
@@ -137,52 +578,81 @@ with st.sidebar:
     )
     
     if uploaded_file is not None:
-        # Save uploaded file temporarily
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Per-upload state (fingerprint, temp file), kept across reruns; the
+        # upload is only written to disk when it is ingested
+        upload = st.session_state.get('upload')
+        if upload is None or upload['file_id'] != uploaded_file.file_id:
+            upload = st.session_state.upload = {
+                'file_id': uploaded_file.file_id,
+                'path': None,
+                # Content fingerprint so re-uploading the same file skips ingestion
+                'hash': hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+            }
+        file_hash = upload['hash']
         
         st.success(f"✓ File uploaded: {uploaded_file.name}")
         
-        # Preview CSV
+        # Preview CSV (parsed from memory, no disk round trip)
+        preview_ok = True
         try:
-            df = pd.read_csv(temp_path)
-            st.write(f"**Preview:** {len(df)} rows, {len(df.columns)} columns")
-            st.dataframe(df.head(10), use_container_width=True)
-            
-            # Store CSV path in session state
-            st.session_state.csv_path = temp_path
+            df_head, num_rows, num_cols = _preview_csv(uploaded_file.file_id, uploaded_file.getvalue(), 10)
+            st.write(f"**Preview:** {num_rows} rows, {num_cols} columns")
+            st.dataframe(df_head, use_container_width=True)
         except Exception as e:
             st.error(f"Error reading CSV: {e}")
-            temp_path = None
+            preview_ok = False
         
         # Ingest button
-        if temp_path:
+        if preview_ok:
             if st.session_state.neo4j_client is not None:
                 clear_existing = st.checkbox("Clear existing data before ingestion", value=False)
                 
-                if st.button("📤 Upload"):
-                    with st.spinner("Ingesting CSV data into Neo4j and processing PDFs..."):
+                ingest_future = st.session_state.get('ingest_future')
+                if st.button("📤 Upload", disabled=ingest_future is not None):
+                    if not clear_existing and st.session_state.get('last_ingested_hash') == file_hash:
+                        # Identical file already ingested this session
+                        st.session_state.data_loaded = True
+                        st.info("ℹ️ This file was already ingested - skipping. Check \"Clear existing data\" to re-ingest.")
+                    else:
+                        # The pipelines need a real path, so persist the upload now
+                        temp_path = _save_upload(uploaded_file, upload)
+                        # Store CSV path in session state
+                        st.session_state.csv_path = temp_path
+                        # Run ingestion on the worker pool so the script thread stays responsive
+                        ingest_future = _ingest_executor().submit(
+                            _run_ingestion,
+                            st.session_state.neo4j_client,
+                            st.session_state.milvus_client,
+                            get_embedder() if st.session_state.milvus_client else None,
+                            temp_path,
+                            clear_existing,
+                            _upload_temp_files()
+                        )
+                        st.session_state.ingest_future = ingest_future
+                        st.session_state.ingest_started = time.monotonic()
+                        st.session_state.ingest_hash = file_hash
+                
+                if ingest_future is not None:
+                    with st.status("Ingesting CSV data into Neo4j and processing PDFs...", expanded=True) as status:
+                        # Poll the worker so the status label shows elapsed time
+                        while not ingest_future.done():
+                            elapsed = time.monotonic() - st.session_state.ingest_started
+                            status.update(label=f"Ingesting CSV data into Neo4j and processing PDFs... ({elapsed:.0f}s)")
+                            time.sleep(0.5)
+                        st.session_state.ingest_future = None
+                        
                         try:
-                            # Initialize PDF processor if Milvus is available
-                            pdf_processor = None
-                            if st.session_state.milvus_client:
-                                pdf_processor = PDFToMilvus(milvus_client=st.session_state.milvus_client)
-                            
-                            converter = CSVToNeo4j(
-                                st.session_state.neo4j_client,
-                                pdf_processor=pdf_processor
-                            )
-                            converter.ingest_csv(
-                                temp_path, 
-                                clear_existing=clear_existing,
-                                process_pdfs=(pdf_processor is not None)
-                            )
+                            converter = ingest_future.result()
+                            pdf_processor = converter.pdf_processor
                             st.session_state.data_loaded = True
                             st.session_state.databases_have_data = True  # Update flag after ingestion
                             st.session_state.databases_checked = True
+                            st.session_state.last_ingested_hash = st.session_state.get('ingest_hash')
+                            # New data invalidates memoized retrieval results and stats
+                            _cached_retrieve.clear()
+                            st.session_state.db_stats = None
+                            st.session_state.milvus_stats = None
+                            status.update(label="✓ Ingestion complete", state="complete")
                             st.success("✓ CSV data successfully ingested into Neo4j!")
                             
                             # Get database stats
@@ -194,7 +664,7 @@ with st.sidebar:
                             """
                             
                             try:
-                                neo4j_stats = st.session_state.neo4j_client.get_database_stats()
+                                neo4j_stats = _get_db_stats()
                                 summary_text += f"""
                                 
                                 **Neo4j Database:**
@@ -211,7 +681,7 @@ with st.sidebar:
                             # Get Milvus stats if PDF processing was enabled
                             if pdf_processor:
                                 try:
-                                    milvus_stats = st.session_state.milvus_client.get_collection_stats()
+                                    milvus_stats = _get_milvus_stats()
                                     summary_text += f"""
                                     
                                     **Milvus (PDF Processing):**
@@ -223,6 +693,7 @@ with st.sidebar:
                             
                             st.info(summary_text)
                         except Exception as e:
+                            status.update(label="✗ Ingestion failed", state="error")
                             st.error(f"✗ Ingestion failed: {e}")
                             st.exception(e)
             else:
@@ -256,11 +727,11 @@ elif not st.session_state.databases_have_data:
     # Show database status
     with st.expander("📊 Current Database Status", expanded=True):
         try:
-            neo4j_stats = st.session_state.neo4j_client.get_database_stats()
+            neo4j_stats = _get_db_stats()
             st.write(f"**Neo4j:** {neo4j_stats.get('total_nodes', 0)} nodes")
             if st.session_state.milvus_client:
                 try:
-                    milvus_stats = st.session_state.milvus_client.get_collection_stats()
+                    milvus_stats = _get_milvus_stats()
                     st.write(f"**Milvus:** {milvus_stats.get('entity_count', 0)} chunks")
                 except:
                     st.write("**Milvus:** Not available")
@@ -273,7 +744,7 @@ else:
     # Show database stats
     with st.expander("📊 Database Status", expanded=False):
         try:
-            neo4j_stats = st.session_state.neo4j_client.get_database_stats()
+            neo4j_stats = _get_db_stats()
             st.write(f"**Neo4j:** {neo4j_stats.get('total_nodes', 0)} nodes, {neo4j_stats.get('total_relationships', 0)} relationships")
             if neo4j_stats.get('by_label'):
                 st.write("**Nodes by type:**")
@@ -282,133 +753,11 @@ else:
             
             if st.session_state.milvus_client:
                 try:
-                    milvus_stats = st.session_state.milvus_client.get_collection_stats()
+                    milvus_stats = _get_milvus_stats()
                     st.write(f"**Milvus:** {milvus_stats.get('entity_count', 0)} PDF chunks")
                 except:
                     st.write("**Milvus:** Not available")
         except Exception as e:
             st.write(f"Could not retrieve stats: {e}")
     
-    # Chat Interface
-    st.subheader("💬 Chat Interface")
-    st.markdown("Ask questions about parts, models, or equipment. The system will search both structured data and PDF manuals.")
-    
-    # Display conversation history
-    if st.session_state.conversation_history:
-        st.markdown("### Conversation History")
-        for i, message in enumerate(st.session_state.conversation_history):
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            
-            if role == 'user':
-                with st.chat_message("user"):
-                    st.write(content)
-            else:
-                with st.chat_message("assistant"):
-                    st.markdown(content)
-                    # PDF URLs are now integrated within the response text itself
-                    # No separate PDF URLs section displayed
-    
-    # Chat input
-    user_query = st.chat_input("Ask a question about parts or models...")
-    
-    if user_query:
-        # Add user message to history
-        st.session_state.conversation_history.append({
-            'role': 'user',
-            'content': user_query
-        })
-        
-        # Process query
-        if st.session_state.query_parser and st.session_state.retriever and st.session_state.response_builder:
-            with st.spinner("Processing your query..."):
-                try:
-                    print(f"\n{'='*60}")
-                    print(f"USER QUERY: {user_query}")
-                    print(f"{'='*60}")
-                    
-                    # Parse query
-                    parsed_query = st.session_state.query_parser.parse(user_query)
-                    print(f"\nParsed Query:")
-                    print(f"  Intent: {parsed_query.get('intent')}")
-                    print(f"  Parts: {parsed_query.get('parts_town_numbers')}")
-                    print(f"  Models: {parsed_query.get('model_names')}")
-                    
-                    # Retrieve data
-                    retrieval_results = st.session_state.retriever.retrieve(
-                        parsed_query,
-                        top_k=5,
-                        similarity_threshold=0.7
-                    )
-                    
-                    print(f"\nRetrieval Results:")
-                    print(f"  Neo4j parts: {len(retrieval_results.get('neo4j_results', {}).get('parts', []))}")
-                    print(f"  Neo4j models: {len(retrieval_results.get('neo4j_results', {}).get('models', []))}")
-                    print(f"  Milvus chunks: {len(retrieval_results.get('milvus_results', []))}")
-                    
-                    # Get context and metadata for streaming
-                    neo4j_results = retrieval_results.get('neo4j_results', {})
-                    milvus_results = retrieval_results.get('milvus_results', [])
-                    query_intent = retrieval_results.get('query_intent', 'general')
-                    
-                    context = st.session_state.response_builder._build_context(neo4j_results, milvus_results)
-                    
-                    # Stream the response in real-time
-                    with st.chat_message("assistant"):
-                        response_placeholder = st.empty()
-                        full_response = ""
-                        
-                        # Get streaming generator
-                        stream_generator = st.session_state.response_builder.generate_streaming_response(
-                            user_query=user_query,
-                            context=context,
-                            conversation_history=st.session_state.conversation_history[:-1],
-                            query_intent=query_intent
-                        )
-                        
-                        # Stream the response word by word
-                        for chunk in stream_generator:
-                            full_response += chunk
-                            response_placeholder.markdown(full_response + "▌")  # Cursor effect
-                        
-                        # Final response without cursor
-                        response_placeholder.markdown(full_response)
-                    
-                    # Extract PDF URLs
-                    pdf_urls = st.session_state.response_builder._extract_relevant_pdf_urls(
-                        neo4j_results, milvus_results, query_intent
-                    )
-                    
-                    print(f"\nResponse completed:")
-                    print(f"  PDF URLs: {len(pdf_urls)}")
-                    print(f"{'='*60}\n")
-                    
-                    # Add assistant response to history
-                    st.session_state.conversation_history.append({
-                        'role': 'assistant',
-                        'content': full_response,
-                        'pdf_urls': pdf_urls,
-                        'sources': []
-                    })
-                    
-                    # Force rerun to update the display
-                    st.rerun()
-                    
-                except Exception as e:
-                    error_msg = f"I encountered an error processing your query: {str(e)}"
-                    st.session_state.conversation_history.append({
-                        'role': 'assistant',
-                        'content': error_msg
-                    })
-                    st.error(error_msg)
-                    st.exception(e)
-                    st.rerun()
-        else:
-            st.error("Query engine not initialized. Please check your database connections.")
-    
-    # Clear conversation button
-    if st.session_state.conversation_history:
-        if st.button("🗑️ Clear Conversation"):
-            st.session_state.conversation_history = []
-            st.rerun()
-
+    _chat_fragment()
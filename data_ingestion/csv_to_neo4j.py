@@ -2,14 +2,28 @@
 Module for ingesting CSV data into Neo4j graph database and PDFs into Milvus.
 """
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import lru_cache
 from typing import Dict, List, Set, Optional
 import sys
 import os
 
 # Add parent directory to path to import database module
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.append(_project_root)
 from database.neo4j_client import Neo4jClient
 from data_ingestion.pdf_to_milvus import PDFToMilvus
+from utils.csv_reader import read_csv, iter_csv_chunks
+
+# Single-character part of the column name -> property name conversion
+_PROP_NAME_TABLE = str.maketrans({' ': '_', '#': 'number', '/': '_'})
+
+
+@lru_cache(maxsize=None)
+def property_name(col: str) -> str:
+    """Convert a column name to a property name (remove spaces, handle special chars)."""
+    return col.translate(_PROP_NAME_TABLE).replace('&amp;', 'and')
 
 
 class CSVToNeo4j:
@@ -28,19 +42,23 @@ class CSVToNeo4j:
         self.processed_parts: Set[str] = set()
         self.processed_models: Set[str] = set()
         self.processed_pdfs: Set[str] = set()
+        # Rows per UNWIND write transaction
+        self.batch_size = 10000
     
-    def read_csv(self, csv_path: str) -> pd.DataFrame:
+    def read_csv(self, csv_path: str, memory_optimize: bool = True) -> pd.DataFrame:
         """
         Read CSV file into pandas DataFrame.
         
         Args:
             csv_path: Path to CSV file
+            memory_optimize: Categorize repetitive string columns
+                             (the DataFrame is held for the whole Neo4j + PDF run)
             
         Returns:
             DataFrame with CSV data
         """
         try:
-            df = pd.read_csv(csv_path)
+            df = read_csv(csv_path, memory_optimize=memory_optimize)
             print(f"✓ Successfully read CSV: {len(df)} rows, {len(df.columns)} columns")
             print(f"  Columns: {list(df.columns)}")
             return df
@@ -76,7 +94,127 @@ class CSVToNeo4j:
             return None
         return str(value).strip()
     
-    def ingest_csv(self, csv_path: str, clear_existing: bool = False, process_pdfs: bool = True):
+    def clean_column(self, series: pd.Series) -> pd.Series:
+        """
+        Vectorized ``clean_value`` for a whole column.
+        
+        Args:
+            series: Column to clean
+            
+        Returns:
+            Object Series of stripped strings, with None where clean_value gives None
+        """
+        values = series.astype('string')
+        keep = values.notna() & (values != '')
+        return values.str.strip().astype(object).where(keep, None)
+    
+    def _flush_batch(self, batch: Dict[str, List]):
+        """
+        Write buffered nodes and relationships to Neo4j.
+        
+        Everything is folded into one row per model-part pair so a single
+        UNWIND statement per transaction writes both nodes, their link and the
+        part's PDFs. Part properties and PDF links ride on the first pair of
+        each part only.
+        
+        Args:
+            batch: Buffers keyed by 'models', 'parts', 'pdfs', 'model_parts', 'part_pdfs'
+        """
+        properties = {part['name']: part['properties'] for part in batch['parts']}
+        pdfs_by_part: Dict[str, List[str]] = {}
+        for link in batch['part_pdfs']:
+            pdfs_by_part.setdefault(link['part_name'], []).append(link['url'])
+        
+        rows = []
+        for pair in batch['model_parts']:
+            part_name = pair['part_name']
+            rows.append({
+                'model': pair['model_name'],
+                'part': part_name,
+                'properties': properties.pop(part_name, {}),
+                'pdf_urls': pdfs_by_part.pop(part_name, [])
+            })
+        
+        self.neo4j.upsert_rows(rows, self.batch_size)
+        for buffer in batch.values():
+            buffer.clear()
+    
+    def _ingest_frame(self, df: pd.DataFrame) -> int:
+        """
+        Build the nodes and relationships for one DataFrame (the whole CSV or one chunk) and write them.
+        
+        Models, parts and PDFs already seen in earlier chunks are skipped via
+        the processed_* sets, so a part keeps the properties of its first row.
+        
+        Args:
+            df: CSV rows
+            
+        Returns:
+            Number of rows in ``df``
+        """
+        # Build all nodes and relationships with column operations, then
+        # write them as batched UNWIND statements
+        total_rows = len(df)
+        pdf_cols = tuple(col for col in df.columns if col.startswith('PDF Link') or 'PDF' in col)
+        # Skip Model (separate node), Parts Town # (node identifier), and PDF columns (handled separately)
+        prop_cols = tuple(col for col in df.columns if col not in ('Model', 'Parts Town #') and col not in pdf_cols)
+        missing = pd.Series([None] * total_rows, index=df.index, dtype=object)
+        # Extract model name
+        models = self.clean_column(df['Model']) if 'Model' in df.columns else missing
+        # Extract Partstown # as unique identifier, falling back to Part description
+        part_ids = missing
+        for col in ['Parts Town #', 'Part']:
+            if col in df.columns:
+                part_ids = part_ids.where(part_ids.fillna('').astype(bool), self.clean_column(df[col]))
+        
+        valid = models.fillna('').astype(bool) & part_ids.fillna('').astype(bool)
+        rows = df[valid]
+        models = models[valid]
+        part_ids = part_ids[valid]
+        
+        batch = {'models': [], 'parts': [], 'pdfs': [], 'model_parts': [], 'part_pdfs': []}
+        
+        # Create model nodes (only once per unique model)
+        for model_name in models.drop_duplicates():
+            if model_name not in self.processed_models:
+                batch['models'].append(model_name)
+                self.processed_models.add(model_name)
+        
+        # Create part nodes (only once per unique Parts Town #, properties from its first row)
+        first_rows = ~part_ids.duplicated() & ~part_ids.isin(self.processed_parts)
+        new_parts = rows[first_rows]
+        prop_names = [property_name(col) for col in prop_cols]
+        prop_values = [self.clean_column(new_parts[col]).tolist() for col in prop_cols]
+        for parts_town_number, *values in zip(part_ids[first_rows], *prop_values):
+            part_properties = {name: value for name, value in zip(prop_names, values) if value is not None}
+            batch['parts'].append({'name': parts_town_number, 'properties': part_properties})
+            self.processed_parts.add(parts_town_number)
+        
+        # Create relationships between models and parts (using Parts Town #)
+        model_parts = pd.DataFrame({'model_name': models, 'part_name': part_ids}).drop_duplicates()
+        batch['model_parts'] = model_parts.to_dict(orient='records')
+        
+        # Handle PDFs (multiple PDF link columns), one (part, url) pair per link
+        if pdf_cols:
+            pdf_links = pd.concat(
+                [pd.DataFrame({'part_name': part_ids, 'url': self.clean_column(rows[col])}) for col in pdf_cols]
+            )
+            pdf_links = pdf_links[pdf_links['url'].fillna('').astype(bool)].drop_duplicates()
+            
+            for pdf_url in pdf_links['url'].drop_duplicates():
+                if pdf_url not in self.processed_pdfs:
+                    batch['pdfs'].append(pdf_url)
+                    self.processed_pdfs.add(pdf_url)
+            batch['part_pdfs'] = pdf_links.to_dict(orient='records')
+        
+        print(f"  Writing {len(batch['models'])} models, {len(batch['parts'])} parts, "
+              f"{len(batch['pdfs'])} PDFs from {total_rows} rows...")
+        self._flush_batch(batch)
+        return total_rows
+    
+    def ingest_csv(self, csv_path: str, clear_existing: bool = False, process_pdfs: bool = True,
+                   df: pd.DataFrame = None, chunksize: Optional[int] = None,
+                   pdf_timeout: Optional[float] = None):
         """
         Main method to ingest CSV into Neo4j and optionally process PDFs into Milvus.
         
@@ -84,6 +222,16 @@ class CSVToNeo4j:
             csv_path: Path to CSV file
             clear_existing: Whether to clear existing database before ingestion
             process_pdfs: Whether to process PDFs into Milvus (requires pdf_processor)
+            df: Optional DataFrame (if already loaded)
+            chunksize: Stream the CSV in chunks of this many rows instead of
+                       loading it whole (ignored when ``df`` is given); the PDF
+                       processor then streams the file on its own as well
+            pdf_timeout: Seconds to wait for PDF processing after the Neo4j
+                         ingestion finishes before cancelling it (None waits indefinitely)
+            
+        Raises:
+            Exception: If Neo4j ingestion or PDF processing fails; PDF
+                       processing is cancelled when Neo4j ingestion fails
         """
         if clear_existing:
             print("Clearing existing database...")
@@ -92,105 +240,58 @@ class CSVToNeo4j:
                 print("Clearing Milvus collection...")
                 self.pdf_processor.milvus_client.clear_collection()
         
-        # Read CSV
-        df = self.read_csv(csv_path)
+        # Unique constraints (and their indexes) before the first MERGE batch
+        self.neo4j.ensure_constraints()
         
-        # Extract columns
-        columns = self.extract_columns(df)
+        # Read CSV (once; the DataFrame is shared with the PDF processor),
+        # or leave it on disk when streaming
+        streaming = df is None and bool(chunksize)
+        if streaming:
+            print(f"✓ Streaming CSV in chunks of {chunksize} rows")
+        elif df is None:
+            df = self.read_csv(csv_path)
         
         print("\nStarting Neo4j ingestion...")
         
-        # Process PDFs in parallel if enabled
-        pdf_thread = None
+        # Process PDFs in parallel if enabled; the future carries any
+        # exception back to the caller instead of losing it in the thread
+        pdf_future = None
         if process_pdfs and self.pdf_processor:
-            import threading
-            # Pass DataFrame to PDF processor
-            pdf_processor_instance = self.pdf_processor
-            pdf_thread = threading.Thread(
-                target=pdf_processor_instance.process_csv_pdfs,
-                args=(csv_path, df)
+            # Pass DataFrame (or chunk size) to PDF processor
+            pdf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-ingest')
+            pdf_future = pdf_executor.submit(
+                self.pdf_processor.process_csv_pdfs,
+                csv_path,
+                df,
+                chunksize=chunksize if streaming else None
             )
-            pdf_thread.daemon = True
-            pdf_thread.start()
+            pdf_executor.shutdown(wait=False)
             print("  → PDF processing started in parallel...")
         
-        # Process each row
-        total_rows = len(df)
-        row_num = 0
-        for idx, row in df.iterrows():
-            row_num += 1
-            if row_num % 100 == 0:
-                print(f"  Processed {row_num}/{total_rows} rows...")
-            
-            # Extract model name
-            model_name = self.clean_value(row.get('Model'))
-            if not model_name:
-                continue
-            
-            # Extract Partstown # as unique identifier (not Part description)
-            parts_town_number = self.clean_value(row.get('Parts Town #'))
-            if not parts_town_number:
-                # Fallback to Part description if Parts Town # is missing
-                parts_town_number = self.clean_value(row.get('Part'))
-                if not parts_town_number:
-                    continue
-            
-            # Extract PDF URLs (handle multiple PDF link columns)
-            pdf_urls = []
-            for col in df.columns:
-                if col.startswith('PDF Link') or 'PDF' in col:
-                    pdf_url = self.clean_value(row.get(col))
-                    if pdf_url and pdf_url.strip():
-                        pdf_urls.append(pdf_url)
-            
-            # Create model node (only once per unique model)
-            if model_name not in self.processed_models:
-                self.neo4j.create_model_node(model_name)
-                self.processed_models.add(model_name)
-            
-            # Create part node (only once per unique Parts Town #)
-            if parts_town_number not in self.processed_parts:
-                # Extract all part properties including Part description
-                part_properties = {}
-                for col in df.columns:
-                    # Skip Model (separate node), Parts Town # (node identifier), and PDF columns (handled separately)
-                    if col in ['Model', 'Parts Town #'] or col.startswith('PDF Link') or 'PDF' in col:
-                        continue
-                    
-                    value = self.clean_value(row.get(col))
-                    if value is not None:
-                        # Convert column name to property name (remove spaces, handle special chars)
-                        prop_name = col.replace(' ', '_').replace('#', 'number').replace('/', '_').replace('&amp;', 'and')
-                        part_properties[prop_name] = value
-                
-                # Use Parts Town # as the unique identifier
-                self.neo4j.create_part_node(parts_town_number, part_properties)
-                self.processed_parts.add(parts_town_number)
-            
-            # Create relationship between model and part (using Parts Town #)
-            self.neo4j.create_model_part_relationship(model_name, parts_town_number)
-            
-            # Handle PDFs if they exist
-            for pdf_url in pdf_urls:
-                if pdf_url and pdf_url.strip():
-                    # Create PDF node (only once per unique URL)
-                    if pdf_url not in self.processed_pdfs:
-                        self.neo4j.create_pdf_node(pdf_url)
-                        self.processed_pdfs.add(pdf_url)
-                    
-                    # Create relationship between part and PDF (using Parts Town #)
-                    self.neo4j.create_part_pdf_relationship(parts_town_number, pdf_url)
+        total_rows = 0
+        try:
+            for frame in (iter_csv_chunks(csv_path, chunksize) if streaming else [df]):
+                total_rows += self._ingest_frame(frame)
+        except BaseException:
+            # Don't leave the PDF pipeline running against a failed ingestion
+            if pdf_future is not None:
+                self.pdf_processor.cancel()
+            raise
         
         print(f"\n✓ Neo4j Ingestion complete!")
         print(f"  - Models processed: {len(self.processed_models)}")
         print(f"  - Parts processed: {len(self.processed_parts)}")
         print(f"  - PDFs linked: {len(self.processed_pdfs)}")
-        print(f"  - Total rows processed: {row_num}")
+        print(f"  - Total rows processed: {total_rows}")
         
         # Wait for PDF processing to complete if it was started
-        if process_pdfs and self.pdf_processor:
+        if pdf_future is not None:
             print("\n⏳ Waiting for PDF processing to complete...")
-            pdf_thread.join()  # Wait for PDF processing thread to finish
+            try:
+                pdf_future.result(timeout=pdf_timeout)  # Re-raises PDF processing errors
+            except FuturesTimeoutError:
+                self.pdf_processor.cancel()
+                raise TimeoutError(f"PDF processing did not finish within {pdf_timeout}s and was cancelled")
             milvus_stats = self.pdf_processor.milvus_client.get_collection_stats()
             print(f"\n✓ PDF Processing complete!")
             print(f"  - PDFs processed: {len(self.pdf_processor.processed_pdfs)}")
@@ -2,9 +2,14 @@
 PDF downloader module for downloading unique PDFs from URLs.
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Set, Dict
+from typing import Set, Dict, Optional
 from tqdm import tqdm
 import hashlib
 
@@ -23,6 +28,26 @@ class PDFDownloader:
         self.download_dir.mkdir(exist_ok=True)
         self.downloaded_urls: Set[str] = set()
         self.failed_downloads: Dict[str, str] = {}
+        # Guards downloaded_urls / failed_downloads across download threads
+        self._lock = threading.Lock()
+        # URL -> filename, since each URL is looked up several times per ingestion
+        self._name_cache: Dict[str, str] = {}
+        # Filenames already in download_dir: one directory scan instead of a stat() per URL
+        self._on_disk: Set[str] = {path.name for path in self.download_dir.glob('*.pdf')}
+        
+        # Keep-alive session shared by the download threads, so requests to the
+        # same host reuse pooled TCP/TLS connections; transient errors are retried
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
     def get_pdf_filename(self, url: str) -> str:
         """
@@ -34,9 +59,13 @@ class PDFDownloader:
         Returns:
             Filename for the PDF
         """
-        # Use URL hash as filename to avoid issues with special characters
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        return f"{url_hash}.pdf"
+        filename = self._name_cache.get(url)
+        if filename is None:
+            # Use URL hash as filename to avoid issues with special characters
+            # (kept as MD5 so PDFs already in download_dir are still found)
+            url_hash = hashlib.md5(url.encode()).hexdigest()
+            filename = self._name_cache[url] = f"{url_hash}.pdf"
+        return filename
     
     def download_pdf(self, url: str, timeout: int = 30) -> Path:
         """
@@ -61,48 +90,66 @@ class PDFDownloader:
         file_path = self.download_dir / filename
         
         # Skip if file already exists
-        if file_path.exists():
-            self.downloaded_urls.add(url)
+        if filename in self._on_disk:
+            with self._lock:
+                self.downloaded_urls.add(url)
             return file_path
         
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=timeout, stream=True)
+            response = self.session.get(url, timeout=timeout, stream=True)
             response.raise_for_status()
             
+            # Body is read once, forward-only, straight from the raw stream
+            # (gzip/deflate still decoded); the first bytes double as the
+            # magic-number probe so the check never buffers the whole file.
+            # A decoded read can return fewer bytes than asked, so read until
+            # 4 bytes or EOF
+            response.raw.decode_content = True
+            first_bytes = b''
+            while len(first_bytes) < 4:
+                data = response.raw.read(4 - len(first_bytes))
+                if not data:
+                    break
+                first_bytes += data
+            
             # Check if content is actually a PDF
             content_type = response.headers.get('Content-Type', '').lower()
             if 'pdf' not in content_type and not url.lower().endswith('.pdf'):
                 # Check first few bytes for PDF magic number
-                first_bytes = response.content[:4]
                 if first_bytes != b'%PDF':
                     raise ValueError(f"URL does not point to a PDF file: {content_type}")
             
-            # Download and save
+            # Download and save (copy loop runs in shutil with a 64 KB buffer)
             with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                f.write(first_bytes)
+                shutil.copyfileobj(response.raw, f, length=1 << 16)
             
-            self.downloaded_urls.add(url)
+            with self._lock:
+                self.downloaded_urls.add(url)
+                self._on_disk.add(filename)
             return file_path
             
         except Exception as e:
-            self.failed_downloads[url] = str(e)
-            if file_path.exists():
-                file_path.unlink()  # Remove partial download
+            with self._lock:
+                self.failed_downloads[url] = str(e)
+            # Remove partial download (missing_ok so cleanup never masks the real error)
+            try:
+                file_path.unlink(missing_ok=True)
+            except OSError:
+                pass
             raise
     
-    def download_pdfs_batch(self, urls: Set[str], show_progress: bool = True) -> Dict[str, Path]:
+    def download_pdfs_batch(self, urls: Set[str], show_progress: bool = True,
+                            max_workers: int = 32,
+                            cancel_event: Optional[threading.Event] = None) -> Dict[str, Path]:
         """
-        Download multiple PDFs.
+        Download multiple PDFs concurrently.
         
         Args:
             urls: Set of PDF URLs to download
             show_progress: Whether to show progress bar
+            max_workers: Number of parallel download threads
+            cancel_event: When set, downloads not yet started are cancelled
             
         Returns:
             Dictionary mapping URLs to file paths
@@ -117,15 +164,22 @@ class PDFDownloader:
                 downloaded[url] = self.download_dir / filename
             return downloaded
         
-        iterator = tqdm(urls_to_download, desc="Downloading PDFs") if show_progress else urls_to_download
-        
-        for url in iterator:
-            try:
-                file_path = self.download_pdf(url)
-                downloaded[url] = file_path
-            except Exception as e:
-                print(f"  ⚠️  Failed to download {url}: {e}")
-                continue
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.download_pdf, url): url for url in urls_to_download}
+            completed = as_completed(futures)
+            iterator = tqdm(completed, total=len(futures), desc="Downloading PDFs") if show_progress else completed
+            
+            for future in iterator:
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                url = futures[future]
+                try:
+                    downloaded[url] = future.result()
+                except Exception as e:
+                    print(f"  ⚠️  Failed to download {url}: {e}")
+                    continue
         
         return downloaded
     
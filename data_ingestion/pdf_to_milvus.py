@@ -2,62 +2,197 @@
 PDF to Milvus ingestion module.
 Orchestrates the complete pipeline: download -> extract -> chunk -> embed -> store.
 """
+import asyncio
+import multiprocessing
+import threading
 import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Set, Dict, List, Optional
 import sys
 import os
 
 # Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.append(_project_root)
 
 from data_ingestion.pdf_downloader import PDFDownloader
-from utils.pdf_processor import PDFProcessor
+from utils.pdf_processor import PDFProcessor, extract_and_chunk
 from utils.embeddings import EmbeddingGenerator
 from database.milvus_client import MilvusClient
+from utils.csv_reader import read_csv, iter_csv_chunks
 
 
 class PDFToMilvus:
     """Handle PDF processing and ingestion into Milvus."""
     
-    def __init__(self, milvus_client: MilvusClient = None):
+    def __init__(self,
+                 milvus_client: MilvusClient = None,
+                 embedding_generator: EmbeddingGenerator = None):
         """
         Initialize PDF to Milvus processor.
         
         Args:
             milvus_client: Milvus client instance (creates new if None)
+            embedding_generator: Embedding generator to reuse (loads a new model if None)
         """
         self.milvus_client = milvus_client or MilvusClient()
         self.pdf_downloader = PDFDownloader()
         self.pdf_processor = PDFProcessor(chunk_size=800, chunk_overlap=100)
-        self.embedding_generator = EmbeddingGenerator()
+        self.embedding_generator = embedding_generator or EmbeddingGenerator()
         
         self.processed_pdfs: Set[str] = set()
         self.total_chunks_processed = 0
+        # Chunks embedded and inserted together when processing a whole CSV
+        self.embed_group_size = 10000
+        # Set by cancel() to stop process_csv_pdfs between downloads / PDFs
+        self._cancelled = threading.Event()
     
-    def extract_unique_pdf_urls(self, csv_path: str) -> Set[str]:
+    def cancel(self):
+        """Ask a running process_csv_pdfs to stop after the PDF it is working on."""
+        self._cancelled.set()
+    
+    def extract_unique_pdf_urls(self, csv_path: str, df: pd.DataFrame = None,
+                                chunksize: Optional[int] = None) -> Set[str]:
         """
         Extract unique PDF URLs from CSV file.
         
         Args:
             csv_path: Path to CSV file
+            df: Optional DataFrame (if already loaded)
+            chunksize: Stream the CSV in chunks of this many rows when ``df`` is not given
             
         Returns:
             Set of unique PDF URLs
         """
-        df = pd.read_csv(csv_path)
-        pdf_urls = set()
-        
-        # Check all columns for PDF links
-        for col in df.columns:
-            if col.startswith('PDF Link') or 'PDF' in col:
-                urls = df[col].dropna().unique()
-                for url in urls:
-                    url_str = str(url).strip()
-                    if url_str and url_str.lower().startswith('http'):
-                        pdf_urls.add(url_str)
-        
-        return pdf_urls
+        if df is None and chunksize:
+            urls: Set[str] = set()
+            for chunk in iter_csv_chunks(csv_path, chunksize):
+                urls.update(self.extract_unique_pdf_urls(csv_path, df=chunk))
+            return urls
+        if df is None:
+            df = read_csv(csv_path)
+        # Check all PDF link columns
+        pdf_cols = [col for col in df.columns if col.startswith('PDF Link') or 'PDF' in col]
+        if not pdf_cols:
+            return set()
+        urls = pd.concat([df[col].dropna().astype('string').str.strip() for col in pdf_cols])
+        urls = urls[urls.str.lower().str.startswith('http')]
+        return set(urls.unique())
+    
+    @staticmethod
+    def _text_column(df: pd.DataFrame, col: str) -> pd.Series:
+        """Column as stripped strings with '' for missing values (or a missing column)."""
+        if col not in df.columns:
+            return pd.Series('', index=df.index, dtype='string')
+        return df[col].astype('string').str.strip().fillna('')
+    
+    def _pdf_info_map(self, df: pd.DataFrame) -> Dict[str, List[Dict]]:
+        """
+        Map each PDF URL to the part info of every row that links it.
+        
+        Built with column operations; URLs and their part lists keep the
+        row-major order in which they appear in the CSV.
+        
+        Args:
+            df: CSV DataFrame
+            
+        Returns:
+            Dictionary of URL -> list of {'parts_town_number', 'manufacturer_number'}
+        """
+        pdf_cols = [col for col in df.columns if col.startswith('PDF Link') or 'PDF' in col]
+        if not pdf_cols or df.empty:
+            return {}
+        
+        # Get Parts Town # (falling back to Part description) and Manufacturer #
+        parts_town_numbers = self._text_column(df, 'Parts Town #')
+        parts_town_numbers = parts_town_numbers.where(parts_town_numbers != '', self._text_column(df, 'Part'))
+        manufacturer_numbers = self._text_column(df, 'Manufacturer #')
+        
+        # One (row, column) cell per PDF link, reordered row-major
+        num_rows = len(df)
+        urls = pd.concat([self._text_column(df, col) for col in pdf_cols], ignore_index=True).to_numpy()
+        rows = np.tile(np.arange(num_rows), len(pdf_cols))
+        order = np.lexsort((np.repeat(np.arange(len(pdf_cols)), num_rows), rows))
+        links = pd.DataFrame({
+            'url': urls[order],
+            'parts_town_number': parts_town_numbers.to_numpy()[rows[order]],
+            'manufacturer_number': manufacturer_numbers.to_numpy()[rows[order]]
+        })
+        links = links[links['url'].str.lower().str.startswith('http')]
+        
+        return {
+            url: group[['parts_town_number', 'manufacturer_number']].to_dict(orient='records')
+            for url, group in links.groupby('url', sort=False)
+        }
+    
+    async def aupsert_batches(self,
+                              chunks: List[Dict],
+                              embeddings: np.ndarray,
+                              batch_size: int = 32,
+                              concurrency: int = 2,
+                              flush: bool = True):
+        """
+        Insert chunks into Milvus in fixed-size batches with bounded concurrency.
+        
+        Batches are sent from worker threads, at most ``concurrency`` at a time,
+        and the collection is flushed once after the last batch.
+        
+        Args:
+            chunks: List of chunk dictionaries with 'text' and 'metadata'
+            embeddings: Numpy array of embeddings aligned with ``chunks``
+            batch_size: Number of chunks per insert request
+            concurrency: Maximum number of insert requests in flight
+            flush: Whether to flush after the last batch (skip when the caller
+                   flushes once at the end of a larger load)
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def insert_batch(start: int):
+            async with semaphore:
+                await asyncio.to_thread(
+                    self.milvus_client.insert_chunks,
+                    chunks[start:start + batch_size],
+                    embeddings[start:start + batch_size],
+                    flush=False
+                )
+        
+        await asyncio.gather(*(insert_batch(start) for start in range(0, len(chunks), batch_size)))
+        if flush:
+            self.milvus_client.flush()
+    
+    def _store_chunk_group(self, chunks: List[Dict], pdfs: List[tuple]):
+        """
+        Embed a group of chunks from several PDFs in one call and insert them into Milvus.
+        
+        Both lists are cleared afterwards.
+        
+        Args:
+            chunks: Chunk dictionaries from PDFProcessor.process_pdf
+            pdfs: (pdf_url, chunk count) for each PDF contributing to ``chunks``
+        """
+        if not chunks:
+            return
+        
+        try:
+            texts = [chunk['text'] for chunk in chunks]
+            # Large forward passes pay off on GPU; keep the default on CPU
+            batch_size = 256 if self.embedding_generator.device == 'cuda' else 32
+            embeddings = self.embedding_generator.generate_embeddings(texts, batch_size=batch_size)
+            # process_csv_pdfs flushes once after the last group
+            asyncio.run(self.aupsert_batches(chunks, embeddings, flush=False))
+            
+            for pdf_url, num_chunks in pdfs:
+                self.processed_pdfs.add(pdf_url)
+                print(f"  ✓ Processed PDF: {num_chunks} chunks from {pdf_url}")
+            self.total_chunks_processed += len(chunks)
+        except Exception as e:
+            print(f"  ✗ Failed to store {len(chunks)} chunks from {len(pdfs)} PDFs: {e}")
+        finally:
+            chunks.clear()
+            pdfs.clear()
     
     def process_pdf_to_milvus(self, 
                               pdf_url: str,
@@ -99,8 +234,8 @@ class PDFToMilvus:
             texts = [chunk['text'] for chunk in chunks]
             embeddings = self.embedding_generator.generate_embeddings(texts)
             
-            # Insert into Milvus
-            self.milvus_client.insert_chunks(chunks, embeddings)
+            # Insert into Milvus in concurrent batches
+            asyncio.run(self.aupsert_batches(chunks, embeddings))
             
             self.processed_pdfs.add(pdf_url)
             self.total_chunks_processed += len(chunks)
@@ -111,44 +246,28 @@ class PDFToMilvus:
             print(f"  ✗ Error processing PDF {pdf_url}: {e}")
             raise
     
-    def process_csv_pdfs(self, csv_path: str, df: pd.DataFrame = None):
+    def process_csv_pdfs(self, csv_path: str, df: pd.DataFrame = None, chunksize: Optional[int] = None):
         """
         Process all PDFs from CSV file.
         
         Args:
             csv_path: Path to CSV file
             df: Optional DataFrame (if already loaded)
+            chunksize: Stream the CSV in chunks of this many rows when ``df`` is not given
         """
-        if df is None:
-            df = pd.read_csv(csv_path)
-        
         print("\n📄 Processing PDFs from CSV...")
         
         # Extract unique PDF URLs with their associated part info
         # A PDF can be associated with multiple parts, so we store lists
-        pdf_info_map: Dict[str, List[Dict]] = {}
-        
-        for _, row in df.iterrows():
-            # Get Parts Town # and Manufacturer #
-            parts_town_number = str(row.get('Parts Town #', '')).strip()
-            if not parts_town_number:
-                # Fallback to Part description if Parts Town # is missing
-                parts_town_number = str(row.get('Part', '')).strip()
-            manufacturer_number = str(row.get('Manufacturer #', '')).strip()
-            
-            # Check all columns for PDF links
-            for col in df.columns:
-                if col.startswith('PDF Link') or 'PDF' in col:
-                    pdf_url = str(row.get(col, '')).strip()
-                    if pdf_url and pdf_url.lower().startswith('http'):
-                        if pdf_url not in pdf_info_map:
-                            pdf_info_map[pdf_url] = []
-                        
-                        # Add part info for this PDF
-                        pdf_info_map[pdf_url].append({
-                            'parts_town_number': parts_town_number,
-                            'manufacturer_number': manufacturer_number
-                        })
+        if df is None and chunksize:
+            pdf_info_map: Dict[str, List[Dict]] = {}
+            for chunk in iter_csv_chunks(csv_path, chunksize):
+                for url, part_info_list in self._pdf_info_map(chunk).items():
+                    pdf_info_map.setdefault(url, []).extend(part_info_list)
+        else:
+            if df is None:
+                df = read_csv(csv_path)
+            pdf_info_map = self._pdf_info_map(df)
         
         print(f"  Found {len(pdf_info_map)} unique PDF URLs")
         
@@ -158,28 +277,75 @@ class PDFToMilvus:
         
         # Download all PDFs first
         print("\n📥 Downloading PDFs...")
-        downloaded_pdfs = self.pdf_downloader.download_pdfs_batch(set(pdf_info_map.keys()))
+        downloaded_pdfs = self.pdf_downloader.download_pdfs_batch(
+            set(pdf_info_map.keys()),
+            cancel_event=self._cancelled
+        )
         
-        # Process each PDF
+        # Extract and chunk every PDF first, then embed and store the chunks in
+        # large groups so the model runs full batches across PDFs
         # For PDFs associated with multiple parts, we'll use the first part's info as primary
         # but all parts will be searchable via the parts_town_number field
         print("\n🔄 Processing PDFs (extract, chunk, embed, store)...")
+        jobs = []
         for pdf_url, part_info_list in pdf_info_map.items():
-            if pdf_url in downloaded_pdfs:
+            if pdf_url in downloaded_pdfs and pdf_url not in self.processed_pdfs:
+                # Use first part's info as primary metadata
+                primary_info = part_info_list[0]
+                metadata = {
+                    'parts_town_number': primary_info['parts_town_number'] or '',
+                    'manufacturer_number': primary_info['manufacturer_number'] or '',
+                    'pdf_url': pdf_url
+                }
+                jobs.append((pdf_url, downloaded_pdfs[pdf_url], metadata))
+        
+        # PDF parsing is CPU-bound, so extract+chunk runs in worker processes
+        # (spawned: forking a process that holds torch/driver threads is unsafe)
+        executor = None
+        if len(jobs) > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=min(len(jobs), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        try:
+            if executor:
+                futures = [
+                    executor.submit(extract_and_chunk, pdf_path, metadata,
+                                    self.pdf_processor.chunk_size, self.pdf_processor.chunk_overlap)
+                    for _, pdf_path, metadata in jobs
+                ]
+            
+            pending_chunks: List[Dict] = []
+            pending_pdfs: List[tuple] = []  # (pdf_url, chunk count) per pending PDF
+            for i, (pdf_url, pdf_path, metadata) in enumerate(jobs):
+                if self._cancelled.is_set():
+                    print("  ⚠️  PDF processing cancelled")
+                    break
                 try:
-                    # Use first part's info as primary metadata
-                    primary_info = part_info_list[0]
-                    
-                    # Process PDF (chunks will be stored with metadata)
-                    self.process_pdf_to_milvus(
-                        pdf_url=pdf_url,
-                        parts_town_number=primary_info['parts_town_number'],
-                        manufacturer_number=primary_info['manufacturer_number'],
-                        pdf_path=downloaded_pdfs[pdf_url]
-                    )
+                    # Process PDF: extract and chunk
+                    if executor:
+                        chunks = futures[i].result()
+                    else:
+                        chunks = self.pdf_processor.process_pdf(pdf_path, metadata)
                 except Exception as e:
                     print(f"  ✗ Failed to process {pdf_url}: {e}")
                     continue
+                
+                if not chunks:
+                    print(f"  ⚠️  No text extracted from PDF: {pdf_url}")
+                    continue
+                
+                pending_chunks.extend(chunks)
+                pending_pdfs.append((pdf_url, len(chunks)))
+                if len(pending_chunks) >= self.embed_group_size:
+                    self._store_chunk_group(pending_chunks, pending_pdfs)
+            
+            self._store_chunk_group(pending_chunks, pending_pdfs)
+            if self.total_chunks_processed:
+                self.milvus_client.flush()
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
         
         # Print summary
         stats = self.pdf_downloader.get_stats()
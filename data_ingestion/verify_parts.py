@@ -3,6 +3,7 @@ Verification script to ensure all unique parts from CSV are in Neo4j.
 """
 import pandas as pd
 import sys
+from itertools import islice
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,14 +23,20 @@ def verify_parts():
     
     # Read CSV
     csv_path = Path(__file__).parent.parent / "Scrapped_data.csv"
-    df = pd.read_csv(csv_path)
+    # Only the identifier column is needed; read it as text (as stored in Neo4j),
+    # in chunks so memory is bounded by the unique values, not the row count
+    csv_unique_parts = set()
+    total_rows = 0
+    for chunk in pd.read_csv(csv_path, usecols=['Parts Town #'], dtype={'Parts Town #': 'string'},
+                             chunksize=500_000):
+        # Get unique Parts Town # values from CSV
+        csv_unique_parts.update(chunk['Parts Town #'].dropna().unique())
+        total_rows += len(chunk)
     
-    # Get unique Parts Town # values from CSV
-    csv_unique_parts = set(df['Parts Town #'].dropna().unique())
     print(f"\n📋 CSV Analysis:")
-    print(f"  Total rows: {len(df)}")
+    print(f"  Total rows: {total_rows}")
     print(f"  Unique Parts Town # values: {len(csv_unique_parts)}")
-    print(f"  Sample: {list(csv_unique_parts)[:5]}")
+    print(f"  Sample: {list(islice(csv_unique_parts, 5))}")
     
     # Connect to Neo4j
     try:
@@ -37,21 +44,20 @@ def verify_parts():
         
         # Get all parts from Neo4j
         query = "MATCH (p:Part) RETURN p.name as parts_town_number"
-        result = client.execute_query(query)
-        neo4j_parts = {record['parts_town_number'] for record in result}
+        neo4j_parts = {record['parts_town_number'] for record in client.iter_query(query)}
         
         print(f"\n🗄️  Neo4j Analysis:")
         print(f"  Total Part nodes: {len(neo4j_parts)}")
-        print(f"  Sample: {list(neo4j_parts)[:5]}")
+        print(f"  Sample: {list(islice(neo4j_parts, 5))}")
         
-        # Compare
+        # Compare (equal sets are the common case: one comparison, no differences built)
         print(f"\n✅ Verification Results:")
-        missing_parts = csv_unique_parts - neo4j_parts
-        extra_parts = neo4j_parts - csv_unique_parts
-        
-        if not missing_parts and not extra_parts:
+        if csv_unique_parts == neo4j_parts:
             print(f"  ✓ All {len(csv_unique_parts)} unique parts from CSV are in Neo4j!")
         else:
+            missing_parts = csv_unique_parts - neo4j_parts
+            extra_parts = neo4j_parts - csv_unique_parts
+            
             if missing_parts:
                 print(f"  ❌ Missing {len(missing_parts)} parts from CSV:")
                 for part in sorted(missing_parts):
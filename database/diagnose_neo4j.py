@@ -2,6 +2,7 @@
 Diagnostic script to check Neo4j database contents.
 Run this to verify if data exists in your Neo4j database.
 """
+import asyncio
 import sys
 import os
 from pathlib import Path
@@ -12,20 +13,32 @@ env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 sys.path.append(str(Path(__file__).parent.parent))
-from database.neo4j_client import Neo4jClient
+from database.neo4j_client import AsyncNeo4jClient, Neo4jClient
 
 
-def main():
+async def main():
     print("=" * 60)
     print("Neo4j Database Diagnostic")
     print("=" * 60)
     
     try:
         client = Neo4jClient()
+        async_client = AsyncNeo4jClient()
+        
+        # Stats and the sample/relationship queries are independent, so run
+        # them concurrently and print the results in order
+        stats, (models, parts, model_parts, part_pdfs) = await asyncio.gather(
+            asyncio.to_thread(client.get_database_stats),
+            async_client.execute_queries([
+                ("MATCH (m:Model) RETURN m LIMIT 5", None),
+                ("MATCH (p:Part) RETURN p LIMIT 5", None),
+                ("MATCH (m:Model)-[r:HAS_PART]->(p:Part) RETURN count(*) as count", None),
+                ("MATCH (p:Part)-[r:HAS_MANUAL]->(pdf:PDF) RETURN count(*) as count", None),
+            ])
+        )
         
         # Get database stats
         print("\n📊 Database Statistics:")
-        stats = client.get_database_stats()
         print(f"  Total nodes: {stats['total_nodes']}")
         print(f"  Total relationships: {stats['total_relationships']}")
         
@@ -38,32 +51,24 @@ def main():
         print("\n🔍 Sample Data:")
         
         # Get sample models
-        query = "MATCH (m:Model) RETURN m LIMIT 5"
-        result = client.execute_query(query)
-        print(f"\n  Sample Models ({len(result)} found):")
-        for record in result[:3]:
+        print(f"\n  Sample Models ({len(models)} found):")
+        for record in models[:3]:
             node = record['m']
             print(f"    - {dict(node)}")
         
         # Get sample parts
-        query = "MATCH (p:Part) RETURN p LIMIT 5"
-        result = client.execute_query(query)
-        print(f"\n  Sample Parts ({len(result)} found):")
-        for record in result[:3]:
+        print(f"\n  Sample Parts ({len(parts)} found):")
+        for record in parts[:3]:
             node = record['p']
             props = dict(node)
             name = props.get('name', 'N/A')
             print(f"    - {name[:50]}...")
         
         # Check relationships
-        query = "MATCH (m:Model)-[r:HAS_PART]->(p:Part) RETURN count(*) as count"
-        result = client.execute_query(query)
-        print(f"\n  Model-Part relationships: {result[0]['count'] if result else 0}")
-        
-        query = "MATCH (p:Part)-[r:HAS_MANUAL]->(pdf:PDF) RETURN count(*) as count"
-        result = client.execute_query(query)
-        print(f"  Part-PDF relationships: {result[0]['count'] if result else 0}")
+        print(f"\n  Model-Part relationships: {model_parts[0]['count'] if model_parts else 0}")
+        print(f"  Part-PDF relationships: {part_pdfs[0]['count'] if part_pdfs else 0}")
         
+        await async_client.close()
         client.close()
         print("\n✅ Diagnostic complete!")
         
@@ -74,5 +79,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
 
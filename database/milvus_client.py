@@ -10,6 +10,7 @@ from pymilvus import (
     utility,
     MilvusException
 )
+from operator import itemgetter
 from typing import List, Dict, Optional
 import numpy as np
 from pathlib import Path
@@ -21,6 +22,57 @@ import os
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Build parameters per supported index type (MILVUS_INDEX_TYPE picks one for new collections)
+INDEX_BUILD_PARAMS = {
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 64, "nbits": 8},  # 1024 dims -> 64 one-byte codes
+}
+# Storage type of the embedding field (MILVUS_VECTOR_TYPE picks one for new collections)
+VECTOR_TYPES = {
+    "FLOAT16": (DataType.FLOAT16_VECTOR, np.float16),  # 2 KB per 1024-dim vector
+    "FLOAT": (DataType.FLOAT_VECTOR, np.float32),      # 4 KB per 1024-dim vector
+}
+# VARCHAR limits (UTF-8 bytes). Chunks are ~800 tokens (3-5 KB of text) and
+# parts_town_number falls back to the part description, so these are close
+# to the real maxima. Over-long text is clipped on insert; the other fields
+# are join keys (Neo4j Part.name / PDF.url), so over-long ones skip the chunk
+VARCHAR_MAX_LENGTHS = {
+    "text": 10000,
+    "parts_town_number": 100,
+    "manufacturer_number": 100,
+    "pdf_url": 500,
+}
+# Matching search-time parameters
+INDEX_SEARCH_PARAMS = {
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 10},
+    "IVF_PQ": {"nprobe": 10},
+}
+
+
+def _varchar_fits(value: str, max_length: int) -> bool:
+    """Whether a string fits a VARCHAR max_length (UTF-8 bytes)."""
+    # Can't exceed the limit even if every character is 4 bytes
+    return len(value) * 4 <= max_length or len(value.encode('utf-8')) <= max_length
+
+
+def _fit_varchar(value: str, max_length: int) -> str:
+    """Clip a string to a VARCHAR max_length (UTF-8 bytes) without splitting a character."""
+    if _varchar_fits(value, max_length):
+        return value
+    return value.encode('utf-8')[:max_length].decode('utf-8', errors='ignore')
+
+
+# Scalar fields of a chunk's metadata, in schema order
+_chunk_fields = itemgetter('parts_town_number', 'manufacturer_number', 'pdf_url', 'page_number', 'chunk_index')
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows are left as is)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
 
 class MilvusClient:
     """Client for interacting with Milvus vector database."""
@@ -73,20 +125,41 @@ class MilvusClient:
         - page_number: Page number in PDF
         - chunk_index: Index of chunk in page
         """
+        # (Re)created or reopened collections are loaded on first use
+        self._loaded = False
+        
         # Check if collection exists
         if utility.has_collection(self.collection_name):
             print(f"✓ Collection '{self.collection_name}' already exists")
             self.collection = Collection(self.collection_name)
+            # Insert and search with the vector type the collection was created with
+            vector_field = next(f for f in self.collection.schema.fields if f.name == "embedding")
+            self.vector_dtype = np.float16 if vector_field.dtype == DataType.FLOAT16_VECTOR else np.float32
+            # Search with the parameters and metric of the index the collection was built with
+            try:
+                index_params = self.collection.indexes[0].params
+                self.index_type = index_params.get('index_type', 'IVF_FLAT')
+                self.metric_type = index_params.get('metric_type', 'L2')
+            except (IndexError, MilvusException):
+                self.index_type = 'IVF_FLAT'
+                self.metric_type = 'L2'
             return
         
-        # Define schema
+        # Define schema (half-precision vectors by default: half the memory and
+        # search bandwidth, negligible loss for BGE-M3)
+        vector_type = os.getenv("MILVUS_VECTOR_TYPE", "FLOAT16").upper()
+        if vector_type not in VECTOR_TYPES:
+            raise ValueError(f"Unsupported MILVUS_VECTOR_TYPE: {vector_type}")
+        vector_field_type, self.vector_dtype = VECTOR_TYPES[vector_type]
         fields = [
             FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),  # BGE-M3 dimension
-            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=10000),
-            FieldSchema(name="parts_town_number", dtype=DataType.VARCHAR, max_length=100),
-            FieldSchema(name="manufacturer_number", dtype=DataType.VARCHAR, max_length=100),
-            FieldSchema(name="pdf_url", dtype=DataType.VARCHAR, max_length=500),
+            FieldSchema(name="embedding", dtype=vector_field_type, dim=1024),  # BGE-M3 dimension
+            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=VARCHAR_MAX_LENGTHS["text"]),
+            FieldSchema(name="parts_town_number", dtype=DataType.VARCHAR,
+                        max_length=VARCHAR_MAX_LENGTHS["parts_town_number"]),
+            FieldSchema(name="manufacturer_number", dtype=DataType.VARCHAR,
+                        max_length=VARCHAR_MAX_LENGTHS["manufacturer_number"]),
+            FieldSchema(name="pdf_url", dtype=DataType.VARCHAR, max_length=VARCHAR_MAX_LENGTHS["pdf_url"]),
             FieldSchema(name="page_number", dtype=DataType.INT64),
             FieldSchema(name="chunk_index", dtype=DataType.INT64),
         ]
@@ -102,11 +175,17 @@ class MilvusClient:
             schema=schema
         )
         
-        # Create index on embedding field
+        # Create index on embedding field (HNSW by default; IVF_PQ trades some
+        # recall for ~16x smaller vectors)
+        self.index_type = os.getenv("MILVUS_INDEX_TYPE", "HNSW").upper()
+        if self.index_type not in INDEX_BUILD_PARAMS:
+            raise ValueError(f"Unsupported MILVUS_INDEX_TYPE: {self.index_type}")
+        # Inner product on unit vectors: same ranking as L2, cheaper per distance
+        self.metric_type = "IP"
         index_params = {
-            "metric_type": "L2",  # L2 distance for similarity search
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 1024}
+            "metric_type": self.metric_type,
+            "index_type": self.index_type,
+            "params": INDEX_BUILD_PARAMS[self.index_type]
         }
         
         self.collection.create_index(
@@ -114,38 +193,92 @@ class MilvusClient:
             index_params=index_params
         )
         
-        print(f"✓ Created collection '{self.collection_name}' with index")
+        print(f"✓ Created collection '{self.collection_name}' with {self.index_type} index")
+    
+    def ensure_loaded(self):
+        """Load the collection into memory on first use instead of before every operation."""
+        if not self._loaded:
+            self.collection.load()
+            self._loaded = True
     
-    def insert_chunks(self, chunks: List[Dict], embeddings: np.ndarray):
+    def insert_chunks(self, chunks: List[Dict], embeddings: np.ndarray, flush: bool = False):
         """
         Insert PDF chunks with embeddings into Milvus.
         
+        Inserted rows are searchable without a flush; call flush() once
+        after the last batch of a bulk load to seal the segments.
+        
         Args:
-            chunks: List of chunk dictionaries with 'text' and 'metadata'
+            chunks: List of chunk dictionaries with 'text' and 'metadata' (as produced
+                    by PDFProcessor, whose metadata always has every field)
             embeddings: Numpy array of embeddings (shape: [num_chunks, embedding_dim])
+            flush: Whether to flush right after inserting
         """
         if len(chunks) != len(embeddings):
             raise ValueError(f"Mismatch: {len(chunks)} chunks but {len(embeddings)} embeddings")
         
-        # Prepare data for insertion
-        texts = [chunk['text'] for chunk in chunks]
-        metadata_list = [chunk['metadata'] for chunk in chunks]
+        if self.metric_type == "IP":
+            # Inner product only equals cosine similarity on unit vectors
+            embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        
+        # Prepare data for insertion: build every scalar column in one pass
+        texts = []
+        parts_town_numbers = []
+        manufacturer_numbers = []
+        pdf_urls = []
+        page_numbers = []
+        chunk_indexes = []
+        limits = VARCHAR_MAX_LENGTHS
+        kept = []  # positions of the chunks that are inserted
+        too_long = set()
+        for position, chunk in enumerate(chunks):
+            parts_town_number, manufacturer_number, pdf_url, page_number, chunk_index = _chunk_fields(chunk['metadata'])
+            # One over-long value would otherwise fail the whole insert request.
+            # Identifiers must match Neo4j exactly, so they are never clipped
+            over = [name for name, value in (('parts_town_number', parts_town_number),
+                                             ('manufacturer_number', manufacturer_number),
+                                             ('pdf_url', pdf_url))
+                    if not _varchar_fits(value, limits[name])]
+            if over:
+                too_long.update(over)
+                continue
+            kept.append(position)
+            texts.append(_fit_varchar(chunk['text'], limits['text']))
+            parts_town_numbers.append(parts_town_number)
+            manufacturer_numbers.append(manufacturer_number)
+            pdf_urls.append(pdf_url)
+            page_numbers.append(page_number)
+            chunk_indexes.append(chunk_index)
+        
+        if too_long:
+            print(f"  ⚠️  Skipped {len(chunks) - len(kept)} chunks whose "
+                  f"{', '.join(sorted(too_long))} exceeds the Milvus VARCHAR limit")
+            if not kept:
+                return
+            embeddings = np.asarray(embeddings)[kept]
         
         data = [
-            embeddings.tolist(),  # Convert numpy array to list
+            # Passed as a contiguous array of the field's type; tolist() would
+            # build a Python float object per dimension per chunk
+            np.ascontiguousarray(embeddings, dtype=self.vector_dtype),
             texts,
-            [meta.get('parts_town_number', '') for meta in metadata_list],
-            [meta.get('manufacturer_number', '') for meta in metadata_list],
-            [meta.get('pdf_url', '') for meta in metadata_list],
-            [meta.get('page_number', 0) for meta in metadata_list],
-            [meta.get('chunk_index', 0) for meta in metadata_list],
+            parts_town_numbers,
+            manufacturer_numbers,
+            pdf_urls,
+            page_numbers,
+            chunk_indexes,
         ]
         
         # Insert data
         self.collection.insert(data)
-        self.collection.flush()
+        if flush:
+            self.flush()
         
-        print(f"✓ Inserted {len(chunks)} chunks into Milvus")
+        print(f"✓ Inserted {len(kept)} chunks into Milvus")
+    
+    def flush(self):
+        """Flush pending inserts so they are sealed and searchable."""
+        self.collection.flush()
     
     def search(self, 
                query_embedding: np.ndarray,
@@ -162,19 +295,47 @@ class MilvusClient:
         Returns:
             List of search results with text and metadata
         """
-        # Load collection into memory
-        self.collection.load()
+        return self.search_batch(query_embedding, top_k=top_k, filter_expr=filter_expr)[0]
+    
+    def search_batch(self,
+                     query_embeddings: np.ndarray,
+                     top_k: int = 5,
+                     filter_expr: str = None) -> List[List[Dict]]:
+        """
+        Search for similar chunks for several query vectors in one request.
         
-        # Prepare search parameters
+        Args:
+            query_embeddings: Query embeddings (shape: [num_queries, embedding_dim]);
+                              a single 1-D vector is treated as one query
+            top_k: Number of results to return per query
+            filter_expr: Optional filter expression applied to every query
+            
+        Returns:
+            One list of search results (with text and metadata) per query, in input order
+        """
+        # Load collection into memory (once per client)
+        self.ensure_loaded()
+        
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings[None, :]
+        if self.metric_type == "IP":
+            query_embeddings = _normalize_rows(query_embeddings)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=self.vector_dtype)
+        
+        # Prepare search parameters for the collection's index type
+        params = dict(INDEX_SEARCH_PARAMS.get(self.index_type, {"nprobe": 10}))
+        if 'ef' in params:
+            params['ef'] = max(params['ef'], top_k)  # HNSW requires ef >= limit
         search_params = {
-            "metric_type": "L2",
-            "params": {"nprobe": 10}
+            "metric_type": self.metric_type,
+            "params": params
         }
         
         # Perform search
         try:
             results = self.collection.search(
-                data=[query_embedding.tolist()],
+                data=query_embeddings,
                 anns_field="embedding",
                 param=search_params,
                 limit=top_k,
@@ -187,7 +348,7 @@ class MilvusClient:
             if filter_expr:
                 try:
                     results = self.collection.search(
-                        data=[query_embedding.tolist()],
+                        data=query_embeddings,
                         anns_field="embedding",
                         param=search_params,
                         limit=top_k,
@@ -195,60 +356,59 @@ class MilvusClient:
                     )
                 except Exception as e2:
                     print(f"Error during Milvus search without filter: {e2}")
-                    return []
+                    return [[] for _ in range(len(query_embeddings))]
             else:
-                return []
+                return [[] for _ in range(len(query_embeddings))]
         
         # Format results - access entity data correctly for pymilvus 2.6.x
-        formatted_results = []
-        for hits in results:
-            for hit in hits:
-                try:
-                    # In pymilvus 2.6.x, entity fields are accessed as attributes
-                    # Check if entity exists and has the expected structure
-                    if hasattr(hit, 'entity') and hit.entity:
-                        entity = hit.entity
-                        formatted_results.append({
-                            'id': hit.id,
-                            'distance': float(hit.distance),
-                            'text': str(getattr(entity, 'text', '')),
-                            'parts_town_number': str(getattr(entity, 'parts_town_number', '')),
-                            'manufacturer_number': str(getattr(entity, 'manufacturer_number', '')),
-                            'pdf_url': str(getattr(entity, 'pdf_url', '')),
-                            'page_number': int(getattr(entity, 'page_number', 0)),
-                        })
-                    else:
-                        # Entity data not available, return minimal result
-                        formatted_results.append({
-                            'id': hit.id,
-                            'distance': float(hit.distance),
-                            'text': '',
-                            'parts_town_number': '',
-                            'manufacturer_number': '',
-                            'pdf_url': '',
-                            'page_number': 0,
-                        })
-                except Exception as e:
-                    print(f"Warning: Error extracting entity data: {e}")
-                    # Return minimal result on error
-                    formatted_results.append({
-                        'id': hit.id,
-                        'distance': float(hit.distance),
-                        'text': '',
-                        'parts_town_number': '',
-                        'manufacturer_number': '',
-                        'pdf_url': '',
-                        'page_number': 0,
-                    })
-        
-        return formatted_results
+        return [[self._format_hit(hit, self.metric_type) for hit in hits] for hits in results]
+    
+    @staticmethod
+    def _format_hit(hit, metric_type: str = "L2") -> Dict:
+        """
+        Turn a search hit into a result dictionary (empty fields if entity data is missing).
+        
+        'distance' is always the squared L2 distance Milvus reports for L2;
+        for IP on unit vectors it is derived as 2 - 2 * score, so callers'
+        distance thresholds hold for either metric.
+        """
+        distance = float(hit.distance)
+        if metric_type == "IP":
+            distance = 2.0 - 2.0 * distance
+        try:
+            # In pymilvus 2.6.x, entity fields are accessed as attributes
+            # Check if entity exists and has the expected structure
+            if hasattr(hit, 'entity') and hit.entity:
+                entity = hit.entity
+                return {
+                    'id': hit.id,
+                    'distance': distance,
+                    'text': str(getattr(entity, 'text', '')),
+                    'parts_town_number': str(getattr(entity, 'parts_town_number', '')),
+                    'manufacturer_number': str(getattr(entity, 'manufacturer_number', '')),
+                    'pdf_url': str(getattr(entity, 'pdf_url', '')),
+                    'page_number': int(getattr(entity, 'page_number', 0)),
+                }
+        except Exception as e:
+            print(f"Warning: Error extracting entity data: {e}")
+        
+        # Entity data not available (or unreadable), return minimal result
+        return {
+            'id': hit.id,
+            'distance': distance,
+            'text': '',
+            'parts_town_number': '',
+            'manufacturer_number': '',
+            'pdf_url': '',
+            'page_number': 0,
+        }
     
     def get_collection_stats(self) -> Dict:
         """Get statistics about the collection."""
         if not utility.has_collection(self.collection_name):
             return {'entity_count': 0}
         
-        self.collection.load()
+        self.ensure_loaded()
         stats = {
             'entity_count': self.collection.num_entities,
             'collection_name': self.collection_name
@@ -275,7 +435,7 @@ class MilvusClient:
         if not utility.has_collection(self.collection_name):
             return []
         
-        self.collection.load()
+        self.ensure_loaded()
         
         # Default output fields (exclude embedding to save space, but can include it if needed)
         if output_fields is None:
@@ -299,40 +459,58 @@ class MilvusClient:
             print(f"Error querying data: {e}")
             return []
     
+    def iter_rows(self, output_fields: List[str], expr: str = "id >= 0", batch_size: int = 10000):
+        """
+        Iterate over every matching record, fetching ``batch_size`` rows per request.
+        
+        Uses a server-side query iterator, so results aren't capped by a
+        query limit and only one page is held in memory at a time.
+        
+        Args:
+            output_fields: Fields to return
+            expr: Filter expression
+            batch_size: Rows per page
+            
+        Yields:
+            Record dictionaries
+        """
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size,
+            expr=expr,
+            output_fields=output_fields
+        )
+        try:
+            while True:
+                page = iterator.next()
+                if not page:
+                    break
+                yield from page
+        finally:
+            iterator.close()
+    
     def get_all_pdf_urls(self) -> List[str]:
         """Get all unique PDF URLs in the collection."""
         if not utility.has_collection(self.collection_name):
             return []
         
-        self.collection.load()
-        
-        # Query to get unique PDF URLs
-        results = self.collection.query(
-            expr="id >= 0",
-            output_fields=["pdf_url"],
-            limit=100000  # Large limit to get all
-        )
+        self.ensure_loaded()
         
-        pdf_urls = list(set([r.get('pdf_url', '') for r in results if r.get('pdf_url')]))
-        return pdf_urls
+        # Every PDF page that produced chunks starts at chunk_index 0, so the
+        # server only has to return one row per page instead of one per chunk
+        rows = self.iter_rows(["pdf_url"], expr="chunk_index == 0")
+        pdf_urls = {r['pdf_url'] for r in rows if r.get('pdf_url')}
+        return list(pdf_urls)
     
     def get_pdf_stats(self) -> Dict:
         """Get statistics grouped by PDF URL."""
         if not utility.has_collection(self.collection_name):
             return {}
         
-        self.collection.load()
-        
-        # Query all records
-        results = self.collection.query(
-            expr="id >= 0",
-            output_fields=["pdf_url", "parts_town_number", "page_number"],
-            limit=100000
-        )
+        self.ensure_loaded()
         
-        # Group by PDF URL
+        # Group by PDF URL while paging through the records
         pdf_stats = {}
-        for r in results:
+        for r in self.iter_rows(["pdf_url", "parts_town_number", "page_number"]):
             pdf_url = r.get('pdf_url', 'Unknown')
             if pdf_url not in pdf_stats:
                 pdf_stats[pdf_url] = {
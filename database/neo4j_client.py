@@ -1,9 +1,11 @@
 """
 Neo4j database client for managing connections and operations.
 """
-from neo4j import GraphDatabase
+import asyncio
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from neo4j.exceptions import ClientError
 import os
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -13,12 +15,45 @@ env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 
+def create_driver(uri: str = None, user: str = None, password: str = None):
+    """
+    Create a pooled Neo4j driver.
+    
+    The driver is thread-safe, so one instance can be shared by every
+    Neo4jClient in the process (see the ``driver`` argument of Neo4jClient).
+    Pool size, connection acquisition timeout (seconds) and maximum
+    connection lifetime (seconds) come from NEO4J_MAX_POOL,
+    NEO4J_ACQ_TIMEOUT and NEO4J_MAX_LIFETIME.
+    
+    Args:
+        uri: Neo4j connection URI (defaults to NEO4J_URI env var)
+        user: Neo4j username (defaults to NEO4J_USER env var)
+        password: Neo4j password (defaults to NEO4J_PASSWORD env var)
+        
+    Returns:
+        neo4j Driver instance
+    """
+    uri = uri or os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    user = user or os.getenv("NEO4J_USER", "neo4j")
+    password = password or os.getenv("NEO4J_PASSWORD", "password")
+    return GraphDatabase.driver(
+        uri,
+        auth=(user, password),
+        max_connection_pool_size=int(os.getenv("NEO4J_MAX_POOL", "50")),
+        connection_acquisition_timeout=float(os.getenv("NEO4J_ACQ_TIMEOUT", "30")),
+        max_connection_lifetime=float(os.getenv("NEO4J_MAX_LIFETIME", "3600")),
+        keep_alive=True
+    )
+
+
 class Neo4jClient:
     """Client for interacting with Neo4j database."""
     
     def __init__(self, uri: str = None, 
                  user: str = None, 
-                 password: str = None):
+                 password: str = None,
+                 driver=None,
+                 database: str = None):
         """
         Initialize Neo4j client.
         
@@ -26,13 +61,23 @@ class Neo4jClient:
             uri: Neo4j connection URI (defaults to NEO4J_URI env var)
             user: Neo4j username (defaults to NEO4J_USER env var)
             password: Neo4j password (defaults to NEO4J_PASSWORD env var)
+            driver: Existing (shared) driver to use instead of opening a new one;
+                    it is left open by close()
+            database: Database name (defaults to NEO4J_DATABASE env var, else the
+                      user's home database); naming it saves the driver a
+                      home-database lookup per session
         """
         # Use provided values or fall back to environment variables
         self.uri = uri or os.getenv("NEO4J_URI", "bolt://localhost:7687")
         self.user = user or os.getenv("NEO4J_USER", "neo4j")
         self.password = password or os.getenv("NEO4J_PASSWORD", "password")
+        self.database = database or os.getenv("NEO4J_DATABASE") or None
         
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        # Whether the server has APOC (None until first checked)
+        self._has_apoc: Optional[bool] = None
+        
+        self._owns_driver = driver is None
+        self.driver = driver or create_driver(self.uri, self.user, self.password)
         self.verify_connectivity()
     
     def verify_connectivity(self):
@@ -44,9 +89,40 @@ class Neo4jClient:
             print(f"✗ Failed to connect to Neo4j: {e}")
             raise
     
+    def ensure_constraints(self):
+        """
+        Create uniqueness constraints on the node keys used by MERGE/MATCH.
+        
+        Each constraint is backed by an index, so lookups by Part.name,
+        Model.name and PDF.url are index seeks instead of label scans. If a
+        constraint can't be created (e.g. existing duplicates), a plain
+        index is created instead; if that fails too (e.g. a user without
+        schema privileges), a warning is printed and lookups fall back to
+        label scans.
+        
+        Called by the ingestion pipeline before its first write, not on
+        connect, so read-only clients never issue schema DDL.
+        """
+        for name, label, prop in (
+            ('part_name', 'Part', 'name'),
+            ('model_name', 'Model', 'name'),
+            ('pdf_url', 'PDF', 'url'),
+        ):
+            try:
+                self.execute_query(
+                    f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+                )
+            except Exception as e:
+                print(f"⚠️  Could not create unique constraint on {label}.{prop}, using an index: {e}")
+                try:
+                    self.execute_query(f"CREATE INDEX {name}_index IF NOT EXISTS FOR (n:{label}) ON (n.{prop})")
+                except Exception as e:
+                    print(f"⚠️  Could not create index on {label}.{prop}: {e}")
+    
     def close(self):
-        """Close the Neo4j driver connection."""
-        self.driver.close()
+        """Close the Neo4j driver connection (unless it is a shared driver)."""
+        if self._owns_driver:
+            self.driver.close()
     
     def execute_query(self, query: str, parameters: dict = None, database: str = None):
         """
@@ -55,12 +131,12 @@ class Neo4jClient:
         Args:
             query: Cypher query string
             parameters: Query parameters dictionary
-            database: Database name (optional, uses default if not specified)
+            database: Database name (optional, uses the client's database if not specified)
             
         Returns:
             Query result
         """
-        with self.driver.session(database=database) as session:
+        with self.driver.session(database=database or self.database) as session:
             try:
                 result = session.run(query, parameters or {})
                 # Consume the result to ensure transaction commits
@@ -71,10 +147,75 @@ class Neo4jClient:
                 print(f"Query: {query[:100]}...")
                 raise
     
+    def iter_query(self, query: str, parameters: dict = None, database: str = None) -> Iterator:
+        """
+        Execute a read query and yield its records one at a time.
+        
+        Records are pulled from the server as the caller iterates, so large
+        results are never held in a list; the session stays open until the
+        generator is exhausted or closed. Use execute_query for small results.
+        
+        Args:
+            query: Cypher query string
+            parameters: Query parameters dictionary
+            database: Database name (optional, uses the client's database if not specified)
+            
+        Yields:
+            Query records
+        """
+        with self.driver.session(database=database or self.database) as session:
+            try:
+                yield from session.run(query, parameters or {})
+            except Exception as e:
+                print(f"Error executing query: {e}")
+                print(f"Query: {query[:100]}...")
+                raise
+    
+    def execute_write(self, query: str, parameters: dict = None, database: str = None):
+        """
+        Execute a write query in a managed write transaction.
+        
+        Unlike execute_query (auto-commit), the driver retries the
+        transaction on transient errors and routes it to a writer.
+        
+        Args:
+            query: Cypher query string
+            parameters: Query parameters dictionary
+            database: Database name (optional, uses the client's database if not specified)
+            
+        Returns:
+            Query result
+        """
+        try:
+            # Consume the result inside the transaction, before it commits
+            return self.execute_write_batch(lambda tx: list(tx.run(query, parameters or {})), database)
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            print(f"Query: {query[:100]}...")
+            raise
+    
+    def execute_write_batch(self, unit_of_work, database: str = None):
+        """
+        Run several write statements in one session and one managed transaction.
+        
+        ``unit_of_work`` receives the transaction and may call ``tx.run(...)``
+        any number of times; everything commits together (and is retried as
+        a whole on transient errors, so it should be idempotent).
+        
+        Args:
+            unit_of_work: Callable taking a transaction; its return value is returned
+            database: Database name (optional, uses the client's database if not specified)
+            
+        Returns:
+            Whatever ``unit_of_work`` returns
+        """
+        with self.driver.session(database=database or self.database) as session:
+            return session.execute_write(unit_of_work)
+    
     def clear_database(self):
         """Clear all nodes and relationships from the database."""
         query = "MATCH (n) DETACH DELETE n"
-        self.execute_query(query)
+        self.execute_write(query)
         print("✓ Database cleared")
     
     def create_model_node(self, model_name: str, properties: dict = None):
@@ -93,7 +234,7 @@ class Neo4jClient:
         SET m += $properties
         RETURN m
         """
-        self.execute_query(query, {'name': model_name, 'properties': properties})
+        self.execute_write(query, {'name': model_name, 'properties': properties})
     
     def create_part_node(self, part_name: str, properties: dict):
         """
@@ -110,7 +251,7 @@ class Neo4jClient:
         SET p += $properties
         RETURN p
         """
-        self.execute_query(query, {'name': part_name, 'properties': properties})
+        self.execute_write(query, {'name': part_name, 'properties': properties})
     
     def create_pdf_node(self, pdf_url: str):
         """
@@ -124,7 +265,7 @@ class Neo4jClient:
         SET pdf.url = $url
         RETURN pdf
         """
-        self.execute_query(query, {'url': pdf_url})
+        self.execute_write(query, {'url': pdf_url})
     
     def create_model_part_relationship(self, model_name: str, part_name: str, properties: dict = None):
         """
@@ -144,7 +285,7 @@ class Neo4jClient:
         SET r += $properties
         RETURN r
         """
-        self.execute_query(query, {
+        self.execute_write(query, {
             'model_name': model_name,
             'part_name': part_name,
             'properties': properties
@@ -164,11 +305,215 @@ class Neo4jClient:
         MERGE (p)-[r:HAS_MANUAL]->(pdf)
         RETURN r
         """
-        self.execute_query(query, {
+        self.execute_write(query, {
             'part_name': part_name,
             'url': pdf_url
         })
     
+    def bulk_exec(self, query: str, rows: List, batch_size: int = 2000, database: str = None):
+        """
+        Run an ``UNWIND $rows`` write query in batches.
+        
+        Each batch is committed in its own managed write transaction, so one
+        round trip and one commit cover ``batch_size`` rows instead of one row.
+        
+        Args:
+            query: Cypher query that unwinds the ``$rows`` parameter
+            rows: Row values to pass to the query
+            batch_size: Number of rows per transaction
+            database: Database name (optional, uses the client's database if not specified)
+        """
+        if not rows:
+            return
+        
+        with self.driver.session(database=database or self.database) as session:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                session.execute_write(lambda tx, b=batch: tx.run(query, rows=b).consume())
+    
+    def create_model_nodes(self, model_names: List[str], batch_size: int = 2000,
+                           properties: Optional[List[Dict]] = None):
+        """
+        Create or update Model nodes in bulk.
+        
+        Args:
+            model_names: Names/IDs of the models
+            batch_size: Number of rows per transaction
+            properties: Optional additional properties per model, aligned with ``model_names``
+        """
+        if properties is None:
+            query = """
+            UNWIND $rows AS name
+            MERGE (m:Model {name: name})
+            """
+            self.bulk_exec(query, model_names, batch_size)
+            return
+        
+        query = """
+        UNWIND $rows AS row
+        MERGE (m:Model {name: row.name})
+        SET m += row.properties
+        """
+        rows = [
+            {'name': name, 'properties': {**(props or {}), 'name': name}}
+            for name, props in zip(model_names, properties)
+        ]
+        self.bulk_exec(query, rows, batch_size)
+    
+    def create_part_nodes(self, parts: List[Dict], batch_size: int = 2000):
+        """
+        Create or update Part nodes in bulk.
+        
+        Args:
+            parts: List of {'name': ..., 'properties': {...}} dictionaries
+            batch_size: Number of rows per transaction
+        """
+        query = """
+        UNWIND $rows AS row
+        MERGE (p:Part {name: row.name})
+        SET p += row.properties
+        """
+        rows = [
+            {'name': part['name'], 'properties': {**part['properties'], 'name': part['name']}}
+            for part in parts
+        ]
+        self.bulk_exec(query, rows, batch_size)
+    
+    def create_pdf_nodes(self, pdf_urls: List[str], batch_size: int = 2000):
+        """
+        Create or update PDF nodes in bulk.
+        
+        Args:
+            pdf_urls: URLs of the PDF manuals
+            batch_size: Number of rows per transaction
+        """
+        query = """
+        UNWIND $rows AS url
+        MERGE (pdf:PDF {url: url})
+        """
+        self.bulk_exec(query, pdf_urls, batch_size)
+    
+    def create_model_part_relationships(self, pairs: List[Dict], batch_size: int = 2000):
+        """
+        Create Model-Part relationships in bulk.
+        
+        Args:
+            pairs: List of {'model_name': ..., 'part_name': ...} dictionaries, each
+                   with optional 'properties' for the relationship
+            batch_size: Number of rows per transaction
+        """
+        query = """
+        UNWIND $rows AS row
+        MATCH (m:Model {name: row.model_name})
+        MATCH (p:Part {name: row.part_name})
+        MERGE (m)-[r:HAS_PART]->(p)
+        SET r += coalesce(row.properties, {})
+        """
+        self.bulk_exec(query, pairs, batch_size)
+    
+    def create_part_pdf_relationships(self, pairs: List[Dict], batch_size: int = 2000):
+        """
+        Create Part-PDF relationships in bulk.
+        
+        Args:
+            pairs: List of {'part_name': ..., 'url': ...} dictionaries
+            batch_size: Number of rows per transaction
+        """
+        query = """
+        UNWIND $rows AS row
+        MATCH (p:Part {name: row.part_name})
+        MATCH (pdf:PDF {url: row.url})
+        MERGE (p)-[r:HAS_MANUAL]->(pdf)
+        """
+        self.bulk_exec(query, pairs, batch_size)
+    
+    def bulk_create_part_pdf(self, pairs: List[Tuple[str, str]], batch_size: int = 1000):
+        """
+        Create Part-PDF relationships in bulk, batched server-side with APOC.
+        
+        The whole list is sent once and ``apoc.periodic.iterate`` commits it
+        in ``batch_size`` transactions on the server. Batches run serially:
+        parallel MERGEs onto shared PDF nodes contend for the same locks.
+        Falls back to create_part_pdf_relationships if APOC isn't installed.
+        
+        Args:
+            pairs: (part_name, pdf_url) tuples
+            batch_size: Number of pairs per server-side transaction
+        """
+        if not pairs:
+            return
+        
+        if self._has_apoc is not False:
+            query = """
+            CALL apoc.periodic.iterate(
+                "UNWIND $pairs AS x RETURN x",
+                "MATCH (p:Part {name: x[0]}) MATCH (pdf:PDF {url: x[1]}) MERGE (p)-[:HAS_MANUAL]->(pdf)",
+                {batchSize: $batch_size, parallel: false, params: {pairs: $pairs}}
+            )
+            YIELD errorMessages
+            RETURN errorMessages
+            """
+            try:
+                result = self.execute_query(query, {'pairs': [list(pair) for pair in pairs], 'batch_size': batch_size})
+                self._has_apoc = True
+            except ClientError as e:
+                if e.code != 'Neo.ClientError.Procedure.ProcedureNotFound':
+                    raise
+                print("⚠️  APOC not available, creating Part-PDF relationships with UNWIND")
+                self._has_apoc = False
+            else:
+                errors = result[0]['errorMessages'] if result else {}
+                if errors:
+                    raise RuntimeError(f"apoc.periodic.iterate failed: {errors}")
+                return
+        
+        self.create_part_pdf_relationships(
+            [{'part_name': part_name, 'url': url} for part_name, url in pairs],
+            batch_size
+        )
+    
+    def upsert_rows(self, rows: List[Dict], batch_size: int = 2000):
+        """
+        Write models, parts, PDFs and their relationships with one statement per batch.
+        
+        Each row MERGEs its Model and Part, links them with HAS_PART, and
+        links the part to each of its PDFs with HAS_MANUAL.
+        
+        Args:
+            rows: List of {'model': ..., 'part': ..., 'properties': {...}, 'pdf_urls': [...]}
+                  dictionaries; pass empty properties/pdf_urls for rows that only add a link
+            batch_size: Number of rows per transaction
+        """
+        query = """
+        UNWIND $rows AS row
+        MERGE (m:Model {name: row.model})
+        MERGE (p:Part {name: row.part})
+        SET p += row.properties, p.name = row.part
+        MERGE (m)-[:HAS_PART]->(p)
+        WITH p, row
+        UNWIND row.pdf_urls AS url
+        MERGE (pdf:PDF {url: url})
+        MERGE (p)-[:HAS_MANUAL]->(pdf)
+        """
+        self.bulk_exec(query, rows, batch_size)
+    
+    def upsert_row(self, model_name: str, part_name: str, part_properties: Dict = None, pdf_urls: List[str] = None):
+        """
+        Write one CSV row (model, part, relationship and PDFs) in a single round trip.
+        
+        Args:
+            model_name: Name/ID of the model
+            part_name: Name/ID of the part
+            part_properties: Properties to set on the part
+            pdf_urls: URLs of the part's PDF manuals
+        """
+        self.upsert_rows([{
+            'model': model_name,
+            'part': part_name,
+            'properties': part_properties or {},
+            'pdf_urls': pdf_urls or []
+        }])
+    
     def get_model_info(self, model_name: str):
         """Get information about a model including its parts."""
         query = """
@@ -191,23 +536,109 @@ class Neo4jClient:
         return result[0] if result else None
     
     def get_database_stats(self):
-        """Get statistics about the database."""
-        stats = {}
-        
-        # Count nodes
-        query = "MATCH (n) RETURN count(n) as count"
-        result = self.execute_query(query)
-        stats['total_nodes'] = result[0]['count'] if result else 0
+        """
+        Get statistics about the database (single round trip).
         
-        # Count relationships
-        query = "MATCH ()-[r]->() RETURN count(r) as count"
-        result = self.execute_query(query)
-        stats['total_relationships'] = result[0]['count'] if result else 0
+        Uses ``apoc.meta.stats()``, which reads the server's count store
+        instead of scanning the graph, when APOC is installed.
+        """
+        if self._has_apoc is not False:
+            try:
+                result = self.execute_query(
+                    "CALL apoc.meta.stats() YIELD nodeCount, relCount, labels "
+                    "RETURN nodeCount, relCount, labels"
+                )
+                self._has_apoc = True
+            except ClientError as e:
+                if e.code != 'Neo.ClientError.Procedure.ProcedureNotFound':
+                    raise
+                self._has_apoc = False
+            else:
+                if result:
+                    record = result[0]
+                    return {
+                        'total_nodes': record['nodeCount'],
+                        'total_relationships': record['relCount'],
+                        'by_label': {label: count for label, count in record['labels'].items() if count}
+                    }
         
-        # Count by label
-        query = "MATCH (n) RETURN labels(n)[0] as label, count(n) as count"
+        query = """
+        CALL { MATCH (n) RETURN count(n) AS total_nodes }
+        CALL { MATCH ()-[r]->() RETURN count(r) AS total_relationships }
+        CALL {
+            MATCH (n)
+            WITH labels(n)[0] AS label, count(n) AS count
+            RETURN collect({label: label, count: count}) AS by_label
+        }
+        RETURN total_nodes, total_relationships, by_label
+        """
         result = self.execute_query(query)
-        stats['by_label'] = {record['label']: record['count'] for record in result}
+        if not result:
+            return {'total_nodes': 0, 'total_relationships': 0, 'by_label': {}}
         
-        return stats
+        record = result[0]
+        return {
+            'total_nodes': record['total_nodes'],
+            'total_relationships': record['total_relationships'],
+            'by_label': {row['label']: row['count'] for row in record['by_label']}
+        }
 
+
+class AsyncNeo4jClient:
+    """Async client for running independent read queries concurrently."""
+    
+    def __init__(self, uri: str = None,
+                 user: str = None,
+                 password: str = None,
+                 database: str = None):
+        """
+        Initialize async Neo4j client.
+        
+        Args:
+            uri: Neo4j connection URI (defaults to NEO4J_URI env var)
+            user: Neo4j username (defaults to NEO4J_USER env var)
+            password: Neo4j password (defaults to NEO4J_PASSWORD env var)
+            database: Database name (defaults to NEO4J_DATABASE env var, else the user's home database)
+        """
+        self.uri = uri or os.getenv("NEO4J_URI", "bolt://localhost:7687")
+        self.user = user or os.getenv("NEO4J_USER", "neo4j")
+        self.password = password or os.getenv("NEO4J_PASSWORD", "password")
+        self.database = database or os.getenv("NEO4J_DATABASE") or None
+        self.driver = AsyncGraphDatabase.driver(
+            self.uri,
+            auth=(self.user, self.password),
+            max_connection_pool_size=int(os.getenv("NEO4J_MAX_POOL", "50")),
+            connection_acquisition_timeout=float(os.getenv("NEO4J_ACQ_TIMEOUT", "30"))
+        )
+    
+    async def close(self):
+        """Close the Neo4j driver connection."""
+        await self.driver.close()
+    
+    async def execute_query(self, query: str, parameters: dict = None, database: str = None) -> List:
+        """
+        Execute a Cypher query in its own session.
+        
+        Args:
+            query: Cypher query string
+            parameters: Query parameters dictionary
+            database: Database name (optional, uses the client's database if not specified)
+            
+        Returns:
+            Query result
+        """
+        async with self.driver.session(database=database or self.database) as session:
+            result = await session.run(query, parameters or {})
+            return [record async for record in result]
+    
+    async def execute_queries(self, queries: List[Tuple[str, Optional[dict]]]) -> List[List]:
+        """
+        Execute independent queries concurrently, one session (connection) each.
+        
+        Args:
+            queries: (query, parameters) pairs
+            
+        Returns:
+            One result list per query, in input order
+        """
+        return await asyncio.gather(*(self.execute_query(query, parameters) for query, parameters in queries))
@@ -2,28 +2,115 @@
 Query parser for understanding user questions and extracting entities.
 """
 import re
+from functools import lru_cache
 from typing import Dict, List, Optional, Set
 
 
+# Patterns are compiled once at import time; parse() runs on every chat message
+
+
+def _compile_upper(pattern: str) -> tuple:
+    """
+    Compile an uppercase-only pattern for exact, case-sensitive scans.
+    
+    Returns:
+        Tuple of (exact pattern for scanning query.upper() of an ASCII query,
+        pattern source for _folded())
+    """
+    return re.compile(pattern), pattern
+
+
+@lru_cache(maxsize=None)
+def _folded(pattern: str) -> re.Pattern:
+    """
+    IGNORECASE build of a _compile_upper() pattern, for non-ASCII queries only.
+    
+    Compiled on first use: ASCII queries never need it, and the folding has to
+    stay (explicit [A-Za-z] would stop matching e.g. 'ſ' and the Kelvin sign).
+    """
+    return re.compile(pattern, re.IGNORECASE)
+
+
+# Part number patterns fused into one alternation so the query is scanned once.
+# Each alternative has exactly one capture group holding the number itself, and
+# the explicit forms come first so "part #X" yields X rather than "#X".
+_PART_NUMBER_RES = _compile_upper(
+    r'PARTS?\s+TOWN\s*#?\s*([A-Z0-9]+)'  # e.g., "parts town #TRNBRG00104"
+    r'|PART\s+#?\s*([A-Z0-9]+)'  # e.g., "part #TRNBRG00104"
+    r'|#([A-Z0-9]+)'  # e.g., #TRNBRG00104
+    r'|\b([A-Z]{2,}\d{3,})\b'  # e.g., TRNBRG00104, ABC12345
+    r'|\b(\d{4,}[A-Z]+)\b'  # e.g., 1234ABC
+)
+
+# Model name patterns (usually alphanumeric with dashes/underscores), fused the same way
+_MODEL_NAME_RES = _compile_upper(
+    r'MODEL\s+([A-Z0-9-_]+)'  # e.g., "model TUD-123"
+    r'|\b([A-Z0-9]+[-_][A-Z0-9]+)\b'  # e.g., TUD-123, ABC_456
+)
+
+# "manufacturer #" or "mfr #" patterns; "manufacturer number X" is tried first so
+# the word "number" is not itself picked up by the "manufacturer #" form
+_MANUFACTURER_NUMBER_RES = _compile_upper(
+    r'MANUFACTURER\s+NUMBER\s+([A-Z0-9]+)'
+    r'|MANUFACTURER\s*#?\s*([A-Z0-9]+)'
+    r'|MFR\s*#?\s*([A-Z0-9]+)'
+)
+
+_WORD_RE = re.compile(r'\b[a-zA-Z0-9]+\b')
+
+# ASCII fast path for _WORD_RE: non-word characters become spaces, so split()
+# yields the \w runs, and a run counts as a word only if it is all alphanumeric
+_ASCII_NON_WORD = str.maketrans({
+    c: ' ' for c in map(chr, range(128)) if not (c.isalnum() or c == '_')
+})
+
+
+# Intent keywords by category; any substring hit counts, as with any(kw in text)
+_INTENT_KEYWORDS = {
+    # Keywords that indicate user wants specific PDF information
+    'pdf_detail': [
+        'install', 'installation', 'setup', 'mount',
+        'specification', 'specs', 'dimensions', 'size',
+        'troubleshoot', 'repair', 'fix', 'diagnose',
+        'maintain', 'maintenance', 'service',
+        'wiring', 'electrical', 'connect', 'wire',
+        'remove', 'replace', 'disassemble',
+        'ground', 'grounding', 'seal', 'sealing',
+        'procedure', 'steps', 'instructions',
+        'how to', 'how do', 'what are the steps',
+        'can you tell me about', 'tell me about',
+        'start up', 'startup', 'start-up', 'operation',
+        'sequence', 'cooling', 'heating', 'control',
+        'describes', 'describe'
+    ],
+    'comparison': ['compare', 'difference', 'vs', 'versus', 'between'],
+    'part': ['part', 'parts', 'component', 'bearing', 'valve', 'sensor'],
+    'model': ['model', 'unit', 'system', 'equipment'],
+}
+
+# All categories in one pattern so the query is scanned once. The lookahead
+# makes every match zero-width, so hits may overlap just like substring checks,
+# and lastgroup names the category that matched.
+_INTENT_KEYWORD_RE = re.compile('(?=' + '|'.join(
+    f"(?P<{category}>{'|'.join(re.escape(kw) for kw in keywords)})"
+    for category, keywords in _INTENT_KEYWORDS.items()
+) + ')')
+
+# Common stopwords to ignore
+_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'are', 'was', 'were', 'be',
+    'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
+    'should', 'could', 'may', 'might', 'can', 'what', 'which', 'who',
+    'where', 'when', 'why', 'how', 'this', 'that', 'these', 'those'
+})
+
+
 class QueryParser:
     """Parse user queries to extract entities and determine query intent."""
     
-    def __init__(self):
-        """Initialize the query parser."""
-        # Common patterns for part numbers (alphanumeric codes)
-        self.part_patterns = [
-            r'\b[A-Z]{2,}\d{3,}\b',  # e.g., TRNBRG00104, ABC12345
-            r'\b\d{4,}[A-Z]{1,}\b',  # e.g., 1234ABC
-            r'#[A-Z0-9]+',  # e.g., #TRNBRG00104
-            r'parts?\s+town\s+#?\s*([A-Z0-9]+)',  # e.g., "parts town #TRNBRG00104"
-            r'part\s+#?\s*([A-Z0-9]+)',  # e.g., "part #TRNBRG00104"
-        ]
-        
-        # Common patterns for model names (usually alphanumeric with dashes/underscores)
-        self.model_patterns = [
-            r'\b[A-Z0-9]+[-_][A-Z0-9]+\b',  # e.g., TUD-123, ABC_456
-            r'model\s+([A-Z0-9-]+)',  # e.g., "model TUD-123"
-        ]
+    # Stateless: patterns are module-level and parse results are memoized in
+    # one module-level cache, so instances are free to create per request
     
     def parse(self, query: str) -> Dict:
         """
@@ -41,16 +128,28 @@ class QueryParser:
             - query_text: Original query text
             - keywords: Important keywords from the query
         """
+        parsed = _parse_cached(query)
+        # Fresh dict and lists per call, so a caller mutating its result
+        # cannot change what later calls get from the cache
+        return {key: list(value) if isinstance(value, list) else value
+                for key, value in parsed.items()}
+    
+    def _parse(self, query: str) -> Dict:
+        """Uncached parse(); see parse() for the returned fields."""
         query_lower = query.lower()
+        # Entities are scanned in the uppercased query, so matches need no
+        # per-match upper() and the regex does no case folding. Only exact for
+        # ASCII ('ß'.upper() is 'SS'); other text keeps the IGNORECASE scan.
+        query_upper = query.upper() if query.isascii() else None
         
         # Extract Parts Town numbers
-        parts_town_numbers = self._extract_parts_town_numbers(query)
+        parts_town_numbers = self._extract_parts_town_numbers(query, query_upper)
         
         # Extract manufacturer numbers (similar patterns)
-        manufacturer_numbers = self._extract_manufacturer_numbers(query)
+        manufacturer_numbers = self._extract_manufacturer_numbers(query, query_lower, query_upper)
         
         # Extract model names
-        model_names = self._extract_model_names(query)
+        model_names = self._extract_model_names(query, query_lower, query_upper)
         
         # Determine intent
         intent = self._determine_intent(
@@ -61,7 +160,7 @@ class QueryParser:
         )
         
         # Extract keywords
-        keywords = self._extract_keywords(query)
+        keywords = self._extract_keywords(query_lower)
         
         return {
             'intent': intent,
@@ -72,63 +171,35 @@ class QueryParser:
             'keywords': keywords
         }
     
-    def _extract_parts_town_numbers(self, query: str) -> List[str]:
+    @staticmethod
+    def _scan(patterns: tuple, query: str, query_upper: Optional[str]) -> List[str]:
+        """Unique uppercased captures of a _compile_upper() pattern pair."""
+        # Only the alternative that matched has a group set, and it is the last one
+        exact, source = patterns
+        if query_upper is not None:
+            return list({m.group(m.lastindex) for m in exact.finditer(query_upper)})
+        return list({m.group(m.lastindex).upper() for m in _folded(source).finditer(query)})
+    
+    def _extract_parts_town_numbers(self, query: str, query_upper: Optional[str] = None) -> List[str]:
         """Extract Parts Town # values from query."""
-        found = set()
-        
-        # Try each pattern
-        for pattern in self.part_patterns:
-            matches = re.findall(pattern, query, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, tuple):
-                    # Pattern with capture group
-                    found.add(match[0].upper())
-                else:
-                    found.add(match.upper())
-        
-        # Also look for explicit "Parts Town #" mentions
-        parts_town_pattern = r'parts?\s+town\s*#?\s*([A-Z0-9]+)'
-        matches = re.findall(parts_town_pattern, query, re.IGNORECASE)
-        found.update([m.upper() for m in matches])
-        
-        return list(found)
+        return self._scan(_PART_NUMBER_RES, query, query_upper)
     
-    def _extract_manufacturer_numbers(self, query: str) -> List[str]:
+    def _extract_manufacturer_numbers(self, query: str, query_lower: str,
+                                      query_upper: Optional[str] = None) -> List[str]:
         """Extract manufacturer numbers from query."""
-        found = set()
-        
-        # Look for "manufacturer #" or "mfr #" patterns
-        patterns = [
-            r'manufacturer\s*#?\s*([A-Z0-9]+)',
-            r'mfr\s*#?\s*([A-Z0-9]+)',
-            r'manufacturer\s+number\s+([A-Z0-9]+)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, query, re.IGNORECASE)
-            found.update([m.upper() for m in matches])
-        
-        return list(found)
+        # Literal prefilter: every alternative starts with one of these words,
+        # and a substring check is far cheaper than a regex scan
+        if 'mfr' not in query_lower and 'manufacturer' not in query_lower:
+            return []
+        return self._scan(_MANUFACTURER_NUMBER_RES, query, query_upper)
     
-    def _extract_model_names(self, query: str) -> List[str]:
+    def _extract_model_names(self, query: str, query_lower: str,
+                             query_upper: Optional[str] = None) -> List[str]:
         """Extract model names from query."""
-        found = set()
-        
-        # Try each pattern
-        for pattern in self.model_patterns:
-            matches = re.findall(pattern, query, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, tuple):
-                    found.add(match[0].upper())
-                else:
-                    found.add(match.upper())
-        
-        # Also look for explicit "model" mentions
-        model_pattern = r'model\s+([A-Z0-9-_]+)'
-        matches = re.findall(model_pattern, query, re.IGNORECASE)
-        found.update([m.upper() for m in matches])
-        
-        return list(found)
+        # Literal prefilter: a match needs the word "model" or a dash/underscore
+        if '-' not in query and '_' not in query and 'model' not in query_lower:
+            return []
+        return self._scan(_MODEL_NAME_RES, query, query_upper)
     
     def _determine_intent(self, 
                          query_lower: str, 
@@ -136,30 +207,13 @@ class QueryParser:
                          manufacturer_numbers: List[str],
                          model_names: List[str]) -> str:
         """Determine the intent of the query."""
-        # Keywords that indicate user wants specific PDF information
-        pdf_detail_keywords = [
-            'install', 'installation', 'setup', 'mount',
-            'specification', 'specs', 'dimensions', 'size',
-            'troubleshoot', 'repair', 'fix', 'diagnose',
-            'maintain', 'maintenance', 'service',
-            'wiring', 'electrical', 'connect', 'wire',
-            'remove', 'replace', 'disassemble',
-            'ground', 'grounding', 'seal', 'sealing',
-            'procedure', 'steps', 'instructions',
-            'how to', 'how do', 'what are the steps',
-            'can you tell me about', 'tell me about',
-            'start up', 'startup', 'start-up', 'operation',
-            'sequence', 'cooling', 'heating', 'control',
-            'describes', 'describe'
-        ]
-        
-        # Check if query is asking for specific PDF information
-        has_pdf_keywords = any(keyword in query_lower for keyword in pdf_detail_keywords)
-        has_entity = parts_town_numbers or manufacturer_numbers or model_names
-        
-        # PDF detail if has PDF keywords
-        if has_pdf_keywords:
-            return 'pdf_detail'
+        # PDF detail if query asks for specific PDF information; it outranks
+        # everything else, so the scan stops at the first such keyword
+        hits = set()
+        for match in _INTENT_KEYWORD_RE.finditer(query_lower):
+            if match.lastgroup == 'pdf_detail':
+                return 'pdf_detail'
+            hits.add(match.lastgroup)
         
         # If specific part/model mentioned, prioritize that
         if parts_town_numbers or manufacturer_numbers:
@@ -169,38 +223,45 @@ class QueryParser:
             return 'model_info'
         
         # Check for comparison queries
-        comparison_keywords = ['compare', 'difference', 'vs', 'versus', 'between']
-        if any(kw in query_lower for kw in comparison_keywords):
+        if 'comparison' in hits:
             return 'comparison'
         
         # Check for part-related keywords
-        part_keywords = ['part', 'parts', 'component', 'bearing', 'valve', 'sensor']
-        if any(kw in query_lower for kw in part_keywords):
+        if 'part' in hits:
             return 'part_info'
         
         # Check for model-related keywords
-        model_keywords = ['model', 'unit', 'system', 'equipment']
-        if any(kw in query_lower for kw in model_keywords):
+        if 'model' in hits:
             return 'model_info'
         
         # Default to general
         return 'general'
     
-    def _extract_keywords(self, query: str) -> List[str]:
-        """Extract important keywords from the query."""
-        # Common stopwords to ignore
-        stopwords = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'are', 'was', 'were', 'be',
-            'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
-            'should', 'could', 'may', 'might', 'can', 'what', 'which', 'who',
-            'where', 'when', 'why', 'how', 'this', 'that', 'these', 'those'
-        }
+    def _extract_keywords(self, query_lower: str) -> List[str]:
+        """Extract important keywords from the (already lowercased) query."""
+        # Extract words (alphanumeric sequences); translate + split runs in C,
+        # the regex is only needed for non-ASCII text
+        if query_lower.isascii():
+            words = [w for w in query_lower.translate(_ASCII_NON_WORD).split() if w.isalnum()]
+        else:
+            words = _WORD_RE.findall(query_lower)
         
-        # Extract words (alphanumeric sequences)
-        words = re.findall(r'\b[a-zA-Z0-9]+\b', query.lower())
-        
-        # Filter out stopwords and short words
-        keywords = [w for w in words if w not in stopwords and len(w) > 2]
+        # Filter out stopwords and short words; repeats are dropped (first-seen
+        # order kept) since each keyword costs a CONTAINS check per node in Neo4j
+        keywords = list(dict.fromkeys(w for w in words if len(w) > 2 and w not in _STOPWORDS))
         
         return keywords
+
+
+_PARSER = QueryParser()
+
+
+@lru_cache(maxsize=512)
+def _parse_cached(query: str) -> Dict:
+    """Memo of parse results shared by all QueryParser instances (retries and repeated questions)."""
+    return _PARSER._parse(query)
+
+
+def parse_query(query: str) -> Dict:
+    """Parse a user query without creating a QueryParser (see QueryParser.parse)."""
+    return _PARSER.parse(query)
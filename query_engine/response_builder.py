@@ -1,390 +1,36 @@
 """
 Response builder for combining and formatting query results using OpenAI GPT-4.
 """
+import asyncio
+import hashlib
 import os
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 # Load environment variables
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Completed LLM responses kept per builder, keyed by the exact messages sent
+RESPONSE_CACHE_SIZE = 256
 
-class ResponseBuilder:
-    """Build structured responses from retrieved data using OpenAI GPT-4."""
-    
-    def __init__(self, model_name: str = "gpt-4o"):
-        """
-        Initialize response builder with OpenAI API.
-        
-        Args:
-            model_name: OpenAI model to use (default: gpt-4o, alternatives: gpt-4-turbo, gpt-4)
-        """
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        
-        self.client = OpenAI(api_key=api_key)
-        self.model_name = model_name
-    
-    def build_response(self, 
-                      user_query: str,
-                      retrieval_results: Dict,
-                      conversation_history: List[Dict] = None) -> Dict:
-        """
-        Build a structured response from retrieval results.
-        
-        Args:
-            user_query: Original user query
-            retrieval_results: Results from Retriever (neo4j_results, milvus_results)
-            conversation_history: Previous conversation messages (for context)
-            
-        Returns:
-            Dictionary with:
-            - response: Formatted response text
-            - sections: Structured sections (Part Info, Model Info, PDF Excerpts)
-            - pdf_urls: List of PDF URLs to display
-            - sources: List of sources used
-        """
-        neo4j_results = retrieval_results.get('neo4j_results', {})
-        milvus_results = retrieval_results.get('milvus_results', [])
-        query_intent = retrieval_results.get('query_intent', 'general')  # Get the intent
-        
-        # Build context from retrieval results
-        context = self._build_context(neo4j_results, milvus_results)
-        
-        print(f"\n📝 Building Response:")
-        print(f"  Query Intent: {query_intent}")
-        print(f"  Neo4j results: {len(neo4j_results.get('parts', []))} parts, {len(neo4j_results.get('models', []))} models")
-        print(f"  Milvus results: {len(milvus_results)} PDF chunks")
-        
-        # Generate response using OpenAI GPT-4
-        response_text = self._generate_response(
-            user_query,
-            context,
-            conversation_history,
-            query_intent  # Pass intent to guide the response
-        )
-        
-        # Extract PDF URLs ONLY from the entities that were queried
-        pdf_urls = self._extract_relevant_pdf_urls(neo4j_results, milvus_results, query_intent)
-        
-        print(f"  Extracted {len(pdf_urls)} relevant PDF URLs for {query_intent} query")
-        if pdf_urls:
-            for i, url in enumerate(pdf_urls[:3], 1):
-                print(f"    [{i}] {url[:80]}...")
-        
-        # Build structured sections
-        sections = self._build_sections(neo4j_results, milvus_results, response_text)
-        
-        return {
-            'response': response_text,
-            'sections': sections,
-            'pdf_urls': pdf_urls,
-            'sources': self._build_sources(neo4j_results, milvus_results)
-        }
-    
-    def _build_context(self, neo4j_results: Dict, milvus_results: List[Dict]) -> str:
-        """Build context string from retrieval results."""
-        context_parts = []
-        
-        # Neo4j structured data
-        if neo4j_results.get('parts'):
-            context_parts.append("## Part Information:")
-            for part in neo4j_results['parts']:
-                props = part.get('properties', {})
-                context_parts.append(f"- Parts Town #: {part.get('parts_town_number', props.get('Parts Town #', props.get('name', 'N/A')))}")
-                context_parts.append(f"  Manufacturer #: {props.get('Manufacturer_number', props.get('Manufacture #', props.get('Manufacturer #', 'N/A')))}")
-                context_parts.append(f"  Part Description: {props.get('Part', props.get('Description', 'N/A'))}")
-                if part.get('models'):
-                    context_parts.append(f"  Used in Models: {', '.join(part['models'])}")
-                if part.get('pdf_urls'):
-                    context_parts.append(f"  PDF Manuals Available: YES")
-                    context_parts.append(f"  PDF URLs: {', '.join(part['pdf_urls'])}")
-                else:
-                    context_parts.append(f"  PDF Manuals Available: NO")
-                context_parts.append("")
-        
-        if neo4j_results.get('models'):
-            context_parts.append("## Model Information:")
-            for model in neo4j_results['models']:
-                props = model.get('properties', {})
-                context_parts.append(f"- Model Name: {model.get('model_name', props.get('name', 'N/A'))}")
-                
-                # Show parts information
-                if model.get('parts_town_numbers'):
-                    parts_list = model.get('parts_town_numbers', [])
-                    remaining = model.get('remaining_parts', 0)
-                    show_all = model.get('show_all', False)
-                    
-                    context_parts.append("  Parts included in this model:")
-                    
-                    # Show all Parts Town # from the list
-                    for ptn in parts_list:
-                        context_parts.append(f"  - {ptn}")
-                    
-                    # If there are remaining parts, show "and X more"
-                    if remaining > 0:
-                        context_parts.append(f"  and {remaining} more")
-                    
-                    context_parts.append("")
-                
-                # Legacy support: if old format is used
-                elif model.get('parts'):
-                    context_parts.append(f"  Parts: {', '.join(model['parts'][:10])}")
-                
-                context_parts.append("")
-        
-        # Milvus PDF excerpts - formatted as numbered list
-        if milvus_results:
-            context_parts.append("## PDF Manual Excerpts:")
-            context_parts.append("Present these as a numbered list in format:")
-            context_parts.append("'1. On page X: [summary of content]'")
-            context_parts.append("")
-            for i, result in enumerate(milvus_results[:5], 1):  # Limit to top 5
-                context_parts.append(f"Excerpt {i}:")
-                context_parts.append(f"  Page Number: {result.get('page_number', 'N/A')}")
-                context_parts.append(f"  PDF URL: {result.get('pdf_url', 'N/A')}")
-                context_parts.append(f"  Parts Town #: {result.get('parts_town_number', 'N/A')}")
-                context_parts.append(f"  Content: {result.get('text', '')}")
-                context_parts.append("")
-        
-        return "\n".join(context_parts)
-    
-    def _generate_response(self,
-                          user_query: str,
-                          context: str,
-                          conversation_history: List[Dict] = None,
-                          query_intent: str = 'general') -> str:
-        """Generate response using OpenAI GPT-4."""
-        # Build system message based on query intent
-        system_message = """You are a helpful assistant for Partstown Trane parts and equipment. 
-Your task is to answer user questions based on the provided structured data and PDF manual excerpts.
-
-## ⚠️ CRITICAL RULES - ACCURACY OVER EVERYTHING:
-1. Use ONLY information explicitly provided in the context
-2. NEVER add, infer, or create information that isn't in the provided data
-3. You MAY organize, structure, and format content for clarity and readability
-4. You MAY create bullet points, sections, and headings to make content understandable
-5. BUT: Every fact, detail, step, or specification MUST come from the provided excerpts
-6. Do NOT fill in gaps with assumptions or general knowledge
-7. If information is missing, state: "This information is not available in the provided data"
-8. Better to have well-organized accurate content than messy verbatim text
-
-BALANCE: Clarity + Accuracy. Organize freely, but never fabricate.
-
-## Response Scope:
-- If the user asks about a PART: ONLY show ## Part Information and ## PDF Manual Excerpts sections
-- If the user asks about a MODEL: ONLY show ## Model Information section
-- If the user asks for SPECIFIC PDF INFORMATION (installation, specs, troubleshooting): Use DETAILED EXCERPT FORMAT
-- DO NOT mix part and model information unless explicitly asked for both
-- DO NOT show Model Information when the query is specifically about a part
-
-## Instructions:
-1. Provide a complete, well-structured answer with ONLY the information explicitly provided
-2. Use the structured data from Neo4j (parts, models) as the primary source
-3. NEVER fabricate or infer data - if it's not provided, don't include it
-
-3. For GENERAL PART QUERIES (if user asks "tell me about part X"):
-   - Show ONLY ## Part Information section
-   - Include ONLY the part details EXPLICITLY provided in the context:
-     * Parts Town # (from context only)
-     * Manufacturer # (from context only - if not provided, show "N/A")
-     * Part descriptions (from context only)
-     * Used in Models (ONLY models listed in context)
-     * PDF Manuals Available (YES/NO based on context)
-     * PDF URLs (from context only - as plain text, NOT clickable links)
-   - If PDF excerpts are available, create ## PDF Manual Excerpts section
-   - DO NOT add any information not explicitly in the context
-   - DO NOT show ## Model Information section for part queries
-
-3b. For PDF-SPECIFIC QUERIES (installation, specs, troubleshooting, startup, operation, etc.):
-   - ⚠️ CRITICAL: Use ONLY information from the PDF excerpts - content must be 100% accurate
-   - You MAY organize and structure the content for readability
-   - You MAY create sections, bullet points, and numbered lists to clarify
-   - BUT you MUST NOT fabricate, add, or infer any information
-   
-   Format:
-     ## [Descriptive title based on content]
-     ### Page [X]
-     [Organized, structured content from the excerpt]
-   
-   - ALLOWED (for readability):
-     * Create clear section headings based on content topics
-     * Add bullet points to organize multiple items
-     * Use numbered lists for sequential procedures
-     * Break paragraphs into logical sections
-     * Add sub-headings for clarity
-   
-   - ABSOLUTELY FORBIDDEN (for accuracy):
-     * DO NOT add information not in the excerpt
-     * DO NOT infer or assume missing details
-     * DO NOT combine info from different contexts
-     * DO NOT add generic knowledge or "typical" procedures
-     * DO NOT create steps that aren't mentioned
-     * DO NOT add technical details not in the excerpt
-   
-   - EXAMPLE:
-     PDF says: "When zone temperature rises, RTRM energizes K10 relay coil, closing K10 contacts, energizing CC2, bringing on CPR2."
-     
-     ✅ GOOD (Organized but accurate):
-     "**First Stage:**
-     - Zone temperature rises above setpoint
-     - RTRM energizes K10 relay coil
-     - K10 contacts close
-     - CC2 is energized
-     - CPR2 compressor turns on"
-     
-     ❌ BAD (Added info):
-     "**First Stage:**
-     - Check temperature sensor
-     - Verify electrical connections
-     - RTRM energizes K10 relay coil..."
-     (Added steps not in original)
-
-4. For MODEL QUERIES ONLY (if user asks about a specific model):
-   - Show ONLY ## Model Information section
-   - Use ONLY the information provided in the context:
-     * Model Name (from context only)
-     * Parts list (EXACTLY as provided in context - do not add or remove any)
-     * If model has <= 7 parts: ALL Parts Town # are listed
-     * If model has > 7 parts: First 5 Parts Town # are listed, followed by "and X more"
-   - Present with heading "Parts included in this model:" and list the Parts Town # EXACTLY as provided
-   - If not all parts shown: "You can ask for more details about specific parts"
-   - DO NOT add any model properties or parts not in the context
-   - DO NOT show ## Part Information section for model queries
-
-5. For PDF Manual Excerpts (ONLY for general part/model queries):
-   - Format as a numbered list: "1. On page X: [summary of the content]"
-   - Include the page number in each point
-   - Provide a brief summary ONLY of what's actually in the excerpt - do not add information
-   - Example: "1. On page 12: Discusses the installation procedure for the drain pan, emphasizing proper sealing and grounding requirements."
-   - Do NOT include PDF URLs in the excerpts section
-   - Do NOT use "### Excerpt X:" format
-   - Do NOT summarize content that isn't in the excerpt
-   
-5b. For PDF-SPECIFIC QUERIES (when query_intent is 'pdf_detail'):
-   - ⚠️ YOU ARE A TECHNICAL WRITER - Organize PDF content for maximum clarity
-   - Your job: Make technical content understandable while keeping it 100% accurate
-   - DO NOT use "On page X:" format
-   
-   Format:
-     ## [Clear, descriptive heading]
-     ### Page [page number]
-     [Well-organized, structured content from excerpt]
-   
-   ALLOWED (for clarity and readability):
-   - Create section headings and sub-headings
-   - Use bullet points for lists of items
-   - Use numbered lists for sequential steps
-   - Break dense paragraphs into logical sections
-   - Add formatting (bold for emphasis, etc.)
-   - Organize information by topic or function
-   
-   FORBIDDEN (for accuracy):
-   - Adding information not in the excerpt
-   - Inferring missing steps or details
-   - Including "typical" or "standard" procedures
-   - Combining unrelated information
-   - Creating content based on general knowledge
-   
-   KEY RULE: Every piece of information in your response MUST come from the excerpt
-   If you organize "Step 1, 2, 3" - those steps MUST be mentioned in the excerpt
-   If you add a section heading - the content under it MUST be from the excerpt
-   
-   EXAMPLES:
-   
-   PDF Excerpt: "RTRM energizes K10 relay, closing contacts, energizing CC2, starting CPR2. If cooling requirement not satisfied, RTRM energizes K9 relay, de-energizes K10, bringing on CPR1."
-   
-   ✅ GOOD (Organized, accurate):
-   "**First Stage Cooling:**
-   - RTRM energizes K10 relay
-   - K10 contacts close
-   - CC2 is energized
-   - CPR2 compressor starts
-   
-   **Second Stage Cooling:**
-   - RTRM energizes K9 relay
-   - K10 is de-energized
-   - CPR1 compressor starts"
-   
-   ❌ BAD (Added info not in excerpt):
-   "**Pre-Start Checks:**
-   - Verify power supply
-   - Check connections
-   
-   **First Stage:**
-   - RTRM energizes K10 relay..."
-
-6. PDF URLs Display Rules:
-   - For PARTS: Show PDF URL as plain text in the Part Information section
-   - Format: "PDF URLs: https://example.com/manual.pdf" (NOT as a clickable link)
-   - Do NOT create a separate PDF URL section or list
-   - Do NOT show PDF URLs in the excerpts
-
-7. Formatting:
-   - Use clear markdown with ## headers for sections
-   - Use bullet points for structured data in Part/Model Information
-   - Use numbered lists for PDF Manual Excerpts
-   - Be concise and only show what was asked for
-
-8. When Information is Missing:
-   - If you cannot answer with the provided data, explicitly state it
-   - Example: "I don't have information about [specific detail] in the available data"
-   - NEVER fill gaps with assumptions, general knowledge, or fabricated content
-   - Better to say "not available" than to provide incorrect information
-
-REMEMBER: Accuracy is paramount. NO FABRICATION under any circumstances."""
-        
-        # Build messages array for OpenAI API
-        messages = [
-            {"role": "system", "content": system_message}
-        ]
-        
-        # Add conversation history (last 10 messages to stay within token limits)
-        if conversation_history:
-            for msg in conversation_history[-10:]:
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                # OpenAI expects 'assistant' not 'assistant'
-                if role == 'assistant':
-                    messages.append({"role": "assistant", "content": content})
-                else:
-                    messages.append({"role": "user", "content": content})
-        
-        # Add current context and query
-        context_message = f"""## Available Information:
-{context}
+# Milvus hits whose text goes into the LLM context
+MAX_CONTEXT_EXCERPTS = 5
 
-## User Question:
-{user_query}
+# Fixed lines of the LLM context, filled with %-formatting (one string per hit)
+_PART_CONTEXT = "- Parts Town #: %s\n  Manufacturer #: %s\n  Part Description: %s"
+_EXCERPT_CONTEXT = "Excerpt %d:\n  Page Number: %s\n  PDF URL: %s\n  Parts Town #: %s\n  Content: %s\n"
+_EXCERPTS_HEADER = ("## PDF Manual Excerpts:\n"
+                    "Present these as a numbered list in format:\n"
+                    "'1. On page X: [summary of content]'\n")
 
-Please provide a helpful response based on the information above."""
-        
-        messages.append({"role": "user", "content": context_message})
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.0,  # Set to 0 for maximum determinism and minimal creativity
-                max_tokens=2000,
-                stream=False  # Non-streaming for this method
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"I apologize, but I encountered an error generating the response: {str(e)}"
-    
-    def generate_streaming_response(self,
-                                    user_query: str,
-                                    context: str,
-                                    conversation_history: List[Dict] = None,
-                                    query_intent: str = 'general'):
-        """Generate streaming response using OpenAI GPT-4 for real-time display."""
-        # Build system message (same as non-streaming)
-        system_message = """You are a helpful assistant for Partstown Trane parts and equipment. 
+# System prompt shared by the blocking and streaming completions
+SYSTEM_MESSAGE = """You are a helpful assistant for Partstown Trane parts and equipment. 
 Your task is to answer user questions based on the provided structured data and PDF manual excerpts.
 
 ## ⚠️ CRITICAL RULES - ACCURACY OVER EVERYTHING:
@@ -561,21 +207,343 @@ BALANCE: Clarity + Accuracy. Organize freely, but never fabricate.
    - Better to say "not available" than to provide incorrect information
 
 REMEMBER: Accuracy is paramount. NO FABRICATION under any circumstances."""
+
+# Response-cache digest state after the system message (see _response_key);
+# the prompt is the same for every call, so it is hashed once at import
+_SYSTEM_MESSAGE_DIGEST = hashlib.blake2b(b'system\x1e' + SYSTEM_MESSAGE.encode() + b'\x1f', digest_size=16)
+
+# Part property names in lookup order (CSV exports spell some columns differently)
+_PTN_KEYS = ('Parts Town #', 'name')
+_MFG_KEYS = ('Manufacturer_number', 'Manufacture #', 'Manufacturer #')
+_DESC_KEYS = ('Part', 'Description')
+
+
+def _first_present(props: Dict, keys: Tuple[str, ...], default: str = 'N/A'):
+    """Value of the first key present in props (nested .get() defaults, evaluated lazily)."""
+    for key in keys:
+        if key in props:
+            return props[key]
+    return default
+
+
+def _normalize_part(part: Dict) -> Tuple:
+    """
+    Resolve a Neo4j part hit's display fields once.
+    
+    Returns:
+        Tuple of (parts_town_number, manufacturer_number, description, models, pdf_urls)
+    """
+    props = part.get('properties', {})
+    if 'parts_town_number' in part:
+        parts_town_number = part['parts_town_number']
+    else:
+        parts_town_number = _first_present(props, _PTN_KEYS)
+    return (
+        parts_town_number,
+        _first_present(props, _MFG_KEYS),
+        _first_present(props, _DESC_KEYS),
+        part.get('models', []),
+        part.get('pdf_urls', [])
+    )
+
+
+def _model_name(model: Dict):
+    """Display name of a Neo4j model hit."""
+    if 'model_name' in model:
+        return model['model_name']
+    return model.get('properties', {}).get('name', 'N/A')
+
+
+class ResponseBuilder:
+    """Build structured responses from retrieved data using OpenAI GPT-4."""
+    
+    # Previous conversation messages sent with each request (token budget)
+    history_window = 10
+    
+    def __init__(self, model_name: str = "gpt-4o"):
+        """
+        Initialize response builder with OpenAI API.
+        
+        The OpenAI client (and its HTTP pool) is only created on first use, so
+        building contexts and sections needs neither the client nor the key.
+        
+        Args:
+            model_name: OpenAI model to use (default: gpt-4o, alternatives: gpt-4-turbo, gpt-4)
+        """
+        self._api_key = os.getenv("OPENAI_API_KEY")
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.model_name = model_name
+        # Optional OpenAI prompt_cache_key: requests sharing it are routed to
+        # the same prompt cache, so the fixed system prompt prefix (messages
+        # are ordered system, history, then the per-query context) is reused.
+        # Sent via extra_body so older openai SDKs accept it as well.
+        prompt_cache_key = os.getenv("OPENAI_PROMPT_CACHE_KEY")
+        self._extra_body = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None
+        # LRU of response texts; temperature is 0, so the same messages give
+        # the same answer and a repeat question skips the API round trip
+        self._response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+    
+    def _require_api_key(self) -> str:
+        """Return the OpenAI API key, raising if it is not configured."""
+        if not self._api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        return self._api_key
+    
+    @property
+    def client(self) -> OpenAI:
+        """OpenAI client, created on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=self._require_api_key())
+        return self._client
+    
+    def build_response(self, 
+                      user_query: str,
+                      retrieval_results: Dict,
+                      conversation_history: List[Dict] = None) -> Dict:
+        """
+        Build a structured response from retrieval results.
+        
+        Args:
+            user_query: Original user query
+            retrieval_results: Results from Retriever (neo4j_results, milvus_results)
+            conversation_history: Previous conversation messages (for context)
+            
+        Returns:
+            Dictionary with:
+            - response: Formatted response text
+            - sections: Structured sections (Part Info, Model Info, PDF Excerpts)
+            - pdf_urls: List of PDF URLs to display
+            - sources: List of sources used
+        """
+        neo4j_results = retrieval_results.get('neo4j_results', {})
+        milvus_results = retrieval_results.get('milvus_results', [])
+        query_intent = retrieval_results.get('query_intent', 'general')  # Get the intent
+        
+        # Part fields are resolved once for both the context and the sections
+        parts = [_normalize_part(part) for part in neo4j_results.get('parts') or []]
+        
+        # Build context and extract PDF URLs ONLY from the entities that were queried
+        context, pdf_urls, milvus_pdf_urls = self._context_and_urls(neo4j_results, milvus_results, query_intent, parts)
+        
+        print(f"\n📝 Building Response:")
+        print(f"  Query Intent: {query_intent}")
+        print(f"  Neo4j results: {len(neo4j_results.get('parts', []))} parts, {len(neo4j_results.get('models', []))} models")
+        print(f"  Milvus results: {len(milvus_results)} PDF chunks")
+        
+        # Generate response using OpenAI GPT-4
+        response_text = self._generate_response(
+            user_query,
+            context,
+            conversation_history,
+            query_intent  # Pass intent to guide the response
+        )
+        
+        print(f"  Extracted {len(pdf_urls)} relevant PDF URLs for {query_intent} query")
+        if pdf_urls:
+            for i, url in enumerate(pdf_urls[:3], 1):
+                print(f"    [{i}] {url[:80]}...")
+        
+        # Build structured sections
+        sections = self._build_sections(neo4j_results, milvus_results, response_text, parts)
+        
+        return {
+            'response': response_text,
+            'sections': sections,
+            'pdf_urls': pdf_urls,
+            'sources': self._build_sources(neo4j_results, milvus_pdf_urls)
+        }
+    
+    def build_streaming_response(self,
+                                 user_query: str,
+                                 retrieval_results: Dict,
+                                 conversation_history: List[Dict] = None):
+        """
+        Streaming version of build_response().
+        
+        Everything that does not depend on the completion is built first, so
+        the caller can render it before the first token arrives.
+        
+        Args:
+            user_query: Original user query
+            retrieval_results: Results from Retriever (neo4j_results, milvus_results)
+            conversation_history: Previous conversation messages (for context)
+            
+        Yields:
+            First a dictionary with sections, pdf_urls and sources (as in
+            build_response()), then the response text chunk by chunk
+        """
+        neo4j_results = retrieval_results.get('neo4j_results', {})
+        milvus_results = retrieval_results.get('milvus_results', [])
+        query_intent = retrieval_results.get('query_intent', 'general')
+        
+        parts = [_normalize_part(part) for part in neo4j_results.get('parts') or []]
+        context, pdf_urls, milvus_pdf_urls = self._context_and_urls(neo4j_results, milvus_results, query_intent, parts)
+        
+        yield {
+            'sections': self._build_sections(neo4j_results, milvus_results, '', parts),
+            'pdf_urls': pdf_urls,
+            'sources': self._build_sources(neo4j_results, milvus_pdf_urls)
+        }
+        yield from self.generate_streaming_response(user_query, context, conversation_history, query_intent)
+    
+    def _build_context(self, neo4j_results: Dict, milvus_results: List[Dict]) -> str:
+        """Build context string from retrieval results."""
+        context, _ = self.build_context_and_urls(neo4j_results, milvus_results, 'general')
+        return context
+    
+    def build_context_and_urls(self,
+                               neo4j_results: Dict,
+                               milvus_results: List[Dict],
+                               query_intent: str) -> Tuple[str, List[str]]:
+        """
+        Build the LLM context and the relevant PDF URLs in a single pass.
+        
+        Same output as ``_build_context`` plus ``_extract_relevant_pdf_urls``,
+        but each retrieval hit is visited only once.
+        
+        Args:
+            neo4j_results: Structured results from Neo4j (parts, models)
+            milvus_results: PDF chunk hits from Milvus
+            query_intent: Intent from the query parser
+            
+        Returns:
+            Tuple of (context string, deduplicated list of PDF URLs)
+        """
+        context, pdf_urls, _ = self._context_and_urls(neo4j_results, milvus_results, query_intent)
+        return context, pdf_urls
+    
+    def _context_and_urls(self,
+                          neo4j_results: Dict,
+                          milvus_results: List[Dict],
+                          query_intent: str,
+                          parts: Optional[List[Tuple]] = None) -> Tuple[str, List[str], List[str]]:
+        """
+        build_context_and_urls() plus every unique Milvus PDF URL, from the same pass.
+        
+        ``parts`` are the Neo4j part hits already passed through _normalize_part
+        (normalized here when not given).
+        """
+        if parts is None:
+            parts = [_normalize_part(part) for part in neo4j_results.get('parts') or []]
+        context_parts = []
+        pdf_urls = {}  # dict as an insertion-ordered set
+        milvus_pdf_urls = {}  # all Milvus hits' URLs, in rank order (for sources)
+        # Parts whose Milvus hits may contribute URLs (None = any part)
+        allowed_parts = None
+        
+        # Neo4j structured data
+        if parts:
+            context_parts.append("## Part Information:")
+            if query_intent == 'part_info':
+                allowed_parts = set()
+            for part, (parts_town_number, manufacturer_number, description, models, part_pdf_urls) in zip(
+                    neo4j_results['parts'], parts):
+                context_parts.append(_PART_CONTEXT % (parts_town_number, manufacturer_number, description))
+                if models:
+                    context_parts.append("  Used in Models: " + ', '.join(models))
+                if part_pdf_urls:
+                    context_parts.append("  PDF Manuals Available: YES\n  PDF URLs: " + ', '.join(part_pdf_urls))
+                else:
+                    context_parts.append("  PDF Manuals Available: NO")
+                context_parts.append("")
+                
+                # Part and general queries take the part's own PDFs
+                if query_intent != 'model_info':
+                    if allowed_parts is not None:
+                        allowed_parts.add(part.get('parts_town_number'))
+                    for pdf_url in part_pdf_urls:
+                        if pdf_url and pdf_url.strip():
+                            pdf_urls[pdf_url] = None
+        
+        if neo4j_results.get('models'):
+            context_parts.append("## Model Information:")
+            if query_intent == 'model_info':
+                allowed_parts = set()
+            for model in neo4j_results['models']:
+                # Each block is appended as few strings as possible; a trailing
+                # "\n" stands for the blank separator line after the block
+                name_line = "- Model Name: %s" % (_model_name(model),)
+                parts_list = model.get('parts_town_numbers')
+                
+                # Show parts information
+                if parts_list:
+                    context_parts.append(name_line + "\n  Parts included in this model:")
+                    
+                    # Show all Parts Town # from the list
+                    context_parts.extend(["  - %s" % (ptn,) for ptn in parts_list])
+                    
+                    # If there are remaining parts, show "and X more"
+                    remaining = model.get('remaining_parts', 0)
+                    if remaining > 0:
+                        context_parts.append("  and %s more" % (remaining,))
+                    
+                    # Blank line after the list, then the block separator
+                    context_parts.append("\n")
+                
+                # Legacy support: if old format is used
+                elif model.get('parts'):
+                    context_parts.append(name_line + "\n  Parts: " + ', '.join(model['parts'][:10]) + "\n")
+                
+                else:
+                    context_parts.append(name_line + "\n")
+                
+                if query_intent == 'model_info':
+                    allowed_parts.update(parts_list or [])
+        elif query_intent == 'model_info':
+            # No model hits: fall back to the general behaviour
+            for *_, part_pdf_urls in parts:
+                for pdf_url in part_pdf_urls:
+                    if pdf_url and pdf_url.strip():
+                        pdf_urls[pdf_url] = None
+        
+        # Milvus PDF excerpts - formatted as numbered list, top hits only
+        # (sliced once; URLs below still come from every hit)
+        if milvus_results:
+            context_parts.append(_EXCERPTS_HEADER)
+            context_parts.extend([
+                _EXCERPT_CONTEXT % (
+                    i,
+                    result.get('page_number', 'N/A'),
+                    result.get('pdf_url', 'N/A'),
+                    result.get('parts_town_number', 'N/A'),
+                    result.get('text', '')
+                )
+                for i, result in enumerate(milvus_results[:MAX_CONTEXT_EXCERPTS], 1)
+            ])
+        for result in milvus_results:
+            pdf_url = result.get('pdf_url', '')
+            if pdf_url and pdf_url.strip():
+                milvus_pdf_urls[pdf_url] = None
+                if allowed_parts is None or result.get('parts_town_number', '') in allowed_parts:
+                    pdf_urls[pdf_url] = None
         
-        # Build messages array
+        return "\n".join(context_parts), list(pdf_urls), list(milvus_pdf_urls)
+    
+    def _build_messages(self,
+                        user_query: str,
+                        context: str,
+                        conversation_history: List[Dict] = None) -> List[Dict]:
+        """Build the chat messages (system prompt, recent history, context + question)."""
+        # Build messages array for OpenAI API
         messages = [
-            {"role": "system", "content": system_message}
+            {"role": "system", "content": SYSTEM_MESSAGE}
         ]
         
+        # Add conversation history (last few messages to stay within token limits);
+        # stored entries carry UI fields (pdf_urls, sources), so only role/content
+        # are passed on, and anything that isn't an assistant turn is sent as user
         if conversation_history:
-            for msg in conversation_history[-10:]:
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role == 'assistant':
-                    messages.append({"role": "assistant", "content": content})
-                else:
-                    messages.append({"role": "user", "content": content})
+            messages.extend(
+                {"role": "assistant" if msg.get('role') == 'assistant' else "user",
+                 "content": msg.get('content', '')}
+                for msg in conversation_history[-self.history_window:]
+            )
         
+        # Add current context and query
         context_message = f"""## Available Information:
 {context}
 
@@ -586,29 +554,123 @@ Please provide a helpful response based on the information above."""
         
         messages.append({"role": "user", "content": context_message})
         
+        return messages
+    
+    @staticmethod
+    def _response_key(messages: List[Dict]) -> bytes:
+        """Digest of the full message list (system prompt, history, context and question)."""
+        if messages[0]['content'] is SYSTEM_MESSAGE:
+            # Resume from the pre-hashed system prompt instead of re-hashing it
+            digest = _SYSTEM_MESSAGE_DIGEST.copy()
+            messages = messages[1:]
+        else:
+            digest = hashlib.blake2b(digest_size=16)
+        for message in messages:
+            digest.update(message['role'].encode())
+            digest.update(b'\x1e')
+            digest.update(message['content'].encode())
+            digest.update(b'\x1f')
+        return digest.digest()
+    
+    def _cached_response(self, key: bytes) -> Optional[str]:
+        """Cached response text for a message digest, or None."""
+        with self._response_cache_lock:
+            text = self._response_cache.get(key)
+            if text is not None:
+                self._response_cache.move_to_end(key)
+            return text
+    
+    def _store_response(self, key: bytes, text: Optional[str], finish_reason: Optional[str] = None):
+        """
+        Remember a completed response, evicting the least recently used one.
+        
+        Empty responses and ones cut off at the token limit (finish_reason
+        'length') are not stored, so the next identical request asks the API again.
+        """
+        if not text or finish_reason == 'length':
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = text
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+    
+    def _completion_options(self, messages: List[Dict], stream: bool) -> Dict:
+        """Keyword arguments for chat.completions.create (same for every call path)."""
+        return {
+            'model': self.model_name,
+            'messages': messages,
+            'temperature': 0.0,  # Set to 0 for maximum determinism and minimal creativity
+            'max_tokens': 2000,
+            'stream': stream,
+            'extra_body': self._extra_body
+        }
+    
+    @staticmethod
+    def _error_message(error: Exception) -> str:
+        """Response text shown when the OpenAI call fails."""
+        return f"I apologize, but I encountered an error generating the response: {str(error)}"
+    
+    def _generate_response(self,
+                          user_query: str,
+                          context: str,
+                          conversation_history: List[Dict] = None,
+                          query_intent: str = 'general') -> str:
+        """Generate response using OpenAI GPT-4."""
+        messages = self._build_messages(user_query, context, conversation_history)
+        key = self._response_key(messages)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self.client.chat.completions.create(**self._completion_options(messages, stream=False))
+            text = response.choices[0].message.content
+            self._store_response(key, text, response.choices[0].finish_reason)
+            return text
+        except Exception as e:
+            return self._error_message(e)
+    
+    def generate_streaming_response(self,
+                                    user_query: str,
+                                    context: str,
+                                    conversation_history: List[Dict] = None,
+                                    query_intent: str = 'general'):
+        """Generate streaming response using OpenAI GPT-4 for real-time display."""
+        messages = self._build_messages(user_query, context, conversation_history)
+        key = self._response_key(messages)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield cached
+            return
+        
         # Return streaming generator
         try:
-            stream = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.0,
-                max_tokens=2000,
-                stream=True  # Enable streaming
-            )
+            stream = self.client.chat.completions.create(**self._completion_options(messages, stream=True))
             
             # Generator function for streaming
+            parts = []
+            finish_reason = None
             for chunk in stream:
                 if chunk.choices[0].delta.content is not None:
+                    parts.append(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            
+            # Only a stream that ran to completion is cached
+            self._store_response(key, ''.join(parts), finish_reason)
                     
         except Exception as e:
-            yield f"I apologize, but I encountered an error generating the response: {str(e)}"
+            yield self._error_message(e)
     
     def _build_sections(self,
                        neo4j_results: Dict,
                        milvus_results: List[Dict],
-                       response_text: str) -> Dict:
-        """Build structured sections from results."""
+                       response_text: str,
+                       parts: Optional[List[Tuple]] = None) -> Dict:
+        """Build structured sections from results (``parts`` as in _context_and_urls)."""
+        if parts is None:
+            parts = [_normalize_part(part) for part in neo4j_results.get('parts') or []]
         sections = {
             'part_info': [],
             'model_info': [],
@@ -616,23 +678,20 @@ Please provide a helpful response based on the information above."""
         }
         
         # Part information
-        if neo4j_results.get('parts'):
-            for part in neo4j_results['parts']:
-                props = part.get('properties', {})
-                sections['part_info'].append({
-                    'parts_town_number': part.get('parts_town_number', props.get('Parts Town #', 'N/A')),
-                    'manufacturer_number': props.get('Manufacture #', props.get('Manufacturer #', 'N/A')),
-                    'description': props.get('Part', props.get('Description', 'N/A')),
-                    'models': part.get('models', []),
-                    'pdf_urls': part.get('pdf_urls', [])
-                })
+        for parts_town_number, manufacturer_number, description, models, part_pdf_urls in parts:
+            sections['part_info'].append({
+                'parts_town_number': parts_town_number,
+                'manufacturer_number': manufacturer_number,
+                'description': description,
+                'models': models,
+                'pdf_urls': part_pdf_urls
+            })
         
         # Model information
         if neo4j_results.get('models'):
             for model in neo4j_results['models']:
-                props = model.get('properties', {})
                 sections['model_info'].append({
-                    'model_name': model.get('model_name', props.get('name', 'N/A')),
+                    'model_name': _model_name(model),
                     'parts': model.get('parts', []),
                     'parts_town_numbers': model.get('parts_town_numbers', [])
                 })
@@ -655,26 +714,16 @@ Please provide a helpful response based on the information above."""
         Extract ONLY PDF URLs relevant to the specific entities queried.
         For part queries: only PDFs from those specific parts.
         For model queries: only PDFs from parts in that model.
+        URLs are deduplicated in first-seen order.
         """
-        pdf_urls = set()
-        
         # For part queries: only extract PDFs from the queried parts
         if query_intent == 'part_info' and neo4j_results.get('parts'):
             queried_parts = {part.get('parts_town_number') for part in neo4j_results['parts']}
             
-            # Get PDFs from Neo4j part results
-            for part in neo4j_results['parts']:
-                part_pdf_urls = part.get('pdf_urls', [])
-                for pdf_url in part_pdf_urls:
-                    if pdf_url and pdf_url.strip():
-                        pdf_urls.add(pdf_url)
-            
-            # Get PDFs from Milvus, but ONLY for the queried parts
-            for result in milvus_results:
-                result_part = result.get('parts_town_number', '')
-                pdf_url = result.get('pdf_url', '')
-                if result_part in queried_parts and pdf_url and pdf_url.strip():
-                    pdf_urls.add(pdf_url)
+            # PDFs from Neo4j part results, then Milvus hits for the queried parts only
+            neo4j_urls = (url for part in neo4j_results['parts'] for url in part.get('pdf_urls', []))
+            milvus_urls = (result.get('pdf_url', '') for result in milvus_results
+                           if result.get('parts_town_number', '') in queried_parts)
         
         # For model queries: extract PDFs from the model's parts
         elif query_intent == 'model_info' and neo4j_results.get('models'):
@@ -684,30 +733,28 @@ Please provide a helpful response based on the information above."""
                 model_parts.update(model.get('parts_town_numbers', []))
             
             # Only include PDFs from Milvus that belong to parts in the queried models
-            for result in milvus_results:
-                result_part = result.get('parts_town_number', '')
-                pdf_url = result.get('pdf_url', '')
-                if result_part in model_parts and pdf_url and pdf_url.strip():
-                    pdf_urls.add(pdf_url)
+            neo4j_urls = ()
+            milvus_urls = (result.get('pdf_url', '') for result in milvus_results
+                           if result.get('parts_town_number', '') in model_parts)
         
         # For general queries: include all PDFs (fallback)
         else:
-            for result in milvus_results:
-                pdf_url = result.get('pdf_url', '')
-                if pdf_url and pdf_url.strip():
-                    pdf_urls.add(pdf_url)
-            
-            if neo4j_results.get('parts'):
-                for part in neo4j_results['parts']:
-                    part_pdf_urls = part.get('pdf_urls', [])
-                    for pdf_url in part_pdf_urls:
-                        if pdf_url and pdf_url.strip():
-                            pdf_urls.add(pdf_url)
+            milvus_urls = (result.get('pdf_url', '') for result in milvus_results)
+            neo4j_urls = (url for part in neo4j_results.get('parts') or [] for url in part.get('pdf_urls', []))
         
-        return list(pdf_urls)
+        return list(dict.fromkeys(
+            url for url in chain(neo4j_urls, milvus_urls) if url and url.strip()
+        ))
     
-    def _build_sources(self, neo4j_results: Dict, milvus_results: List[Dict]) -> List[Dict]:
-        """Build list of sources used."""
+    def _build_sources(self, neo4j_results: Dict, milvus_pdf_urls: List[str]) -> List[Dict]:
+        """
+        Build list of sources used.
+        
+        Args:
+            neo4j_results: Structured results from Neo4j (parts, models)
+            milvus_pdf_urls: Unique PDF URLs of the Milvus hits, in rank order
+                             (collected by _context_and_urls)
+        """
         sources = []
         
         # Add Neo4j sources
@@ -717,18 +764,109 @@ Please provide a helpful response based on the information above."""
                 'description': 'Structured parts and models data'
             })
         
-        # Add PDF sources (extract unique URLs from milvus results)
-        pdf_urls = set()
-        for result in milvus_results:
-            pdf_url = result.get('pdf_url', '')
-            if pdf_url and pdf_url.strip():
-                pdf_urls.add(pdf_url)
-        
-        for pdf_url in pdf_urls:
-            sources.append({
-                'type': 'PDF Manual',
-                'url': pdf_url,
-                'description': f'PDF manual excerpt'
-            })
+        # Add PDF sources; a dict display with constant keys and values is the
+        # cheapest per-URL build (merging a shared template dict is slower)
+        sources.extend([
+            {'type': 'PDF Manual', 'url': pdf_url, 'description': 'PDF manual excerpt'}
+            for pdf_url in milvus_pdf_urls
+        ])
         
         return sources
+
+
+class AsyncResponseBuilder(ResponseBuilder):
+    """ResponseBuilder whose OpenAI calls are awaitable, so several queries can be answered concurrently."""
+    
+    def __init__(self, model_name: str = "gpt-4o"):
+        """
+        Initialize response builder with the async OpenAI client.
+        
+        Args:
+            model_name: OpenAI model to use (default: gpt-4o, alternatives: gpt-4-turbo, gpt-4)
+        """
+        super().__init__(model_name)
+        self._async_client = None
+    
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Async OpenAI client, created on first access."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self._require_api_key())
+        return self._async_client
+    
+    async def close(self):
+        """Close the async OpenAI client's HTTP connections (if one was created)."""
+        if self._async_client is not None:
+            await self._async_client.close()
+    
+    async def agenerate_streaming_response(self,
+                                           user_query: str,
+                                           context: str,
+                                           conversation_history: List[Dict] = None,
+                                           query_intent: str = 'general'):
+        """Async generator yielding response text as it arrives from OpenAI."""
+        messages = self._build_messages(user_query, context, conversation_history)
+        key = self._response_key(messages)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        try:
+            stream = await self.async_client.chat.completions.create(**self._completion_options(messages, stream=True))
+            
+            parts = []
+            finish_reason = None
+            async for chunk in stream:
+                if chunk.choices:
+                    if chunk.choices[0].delta.content is not None:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+            
+            self._store_response(key, ''.join(parts), finish_reason)
+        
+        except Exception as e:
+            yield self._error_message(e)
+    
+    async def abuild_response(self,
+                              user_query: str,
+                              retrieval_results: Dict,
+                              conversation_history: List[Dict] = None) -> Dict:
+        """
+        Async version of build_response().
+        
+        The sections are built in a worker thread while the completion
+        streams in, instead of after it.
+        
+        Args:
+            user_query: Original user query
+            retrieval_results: Results from Retriever (neo4j_results, milvus_results)
+            conversation_history: Previous conversation messages (for context)
+            
+        Returns:
+            Same dictionary as build_response()
+        """
+        neo4j_results = retrieval_results.get('neo4j_results', {})
+        milvus_results = retrieval_results.get('milvus_results', [])
+        query_intent = retrieval_results.get('query_intent', 'general')
+        
+        parts = [_normalize_part(part) for part in neo4j_results.get('parts') or []]
+        context, pdf_urls, milvus_pdf_urls = self._context_and_urls(neo4j_results, milvus_results, query_intent, parts)
+        
+        # _build_sections does not depend on the response text
+        sections_task = asyncio.create_task(
+            asyncio.to_thread(self._build_sections, neo4j_results, milvus_results, '', parts)
+        )
+        response_parts = [
+            text async for text in self.agenerate_streaming_response(
+                user_query, context, conversation_history, query_intent
+            )
+        ]
+        
+        return {
+            'response': ''.join(response_parts),
+            'sections': await sections_task,
+            'pdf_urls': pdf_urls,
+            'sources': self._build_sources(neo4j_results, milvus_pdf_urls)
+        }
@@ -1,12 +1,24 @@
 """
 Retriever for fetching data from Neo4j and Milvus.
 """
+import asyncio
 from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from database.neo4j_client import Neo4jClient
 from database.milvus_client import MilvusClient
 from utils.embeddings import EmbeddingGenerator
 
+# Runs the Milvus branch of retrieve() next to the caller's Neo4j lookup.
+# One pool per process, shared by every Retriever (the app builds one per
+# session); threads start on demand and are joined at interpreter exit
+_RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='retrieve')
+
+
+def _hit_order(hit: Dict):
+    """Sort key for Milvus hits: distance, then source, so equal distances give byte-stable contexts."""
+    return hit['distance'], hit['pdf_url'], hit['page_number']
+
 
 class Retriever:
     """Retrieve data from Neo4j and Milvus based on parsed queries."""
@@ -54,18 +66,58 @@ class Retriever:
             'query_intent': parsed_query.get('intent', 'general')  # Pass intent to response builder
         }
         
-        # Retrieve from Neo4j
+        # Retrieve from Milvus in the background (only if Milvus is available)
+        milvus_future = None
+        if self.milvus and self.embedding_generator:
+            milvus_future = _RETRIEVAL_EXECUTOR.submit(
+                self._retrieve_from_milvus,
+                parsed_query,
+                top_k=top_k,
+                similarity_threshold=similarity_threshold
+            )
+        
+        # Retrieve from Neo4j while the Milvus search is in flight
         results['neo4j_results'] = self._retrieve_from_neo4j(parsed_query)
         
-        # Retrieve from Milvus (only if Milvus is available and query is relevant)
+        if milvus_future is not None:
+            results['milvus_results'] = milvus_future.result()
+        
+        return results
+    
+    async def aretrieve(self,
+                        parsed_query: Dict,
+                        top_k: int = 5,
+                        similarity_threshold: float = 0.7) -> Dict:
+        """
+        Awaitable retrieve(): the Neo4j and Milvus lookups run in worker threads
+        and are gathered, so the event loop stays free (e.g. for an in-flight
+        AsyncResponseBuilder call) while both are pending.
+        
+        Args:
+            parsed_query: Parsed query dictionary from QueryParser
+            top_k: Number of top results to retrieve from Milvus
+            similarity_threshold: Minimum similarity score for Milvus results
+            
+        Returns:
+            Same dictionary as retrieve()
+        """
+        neo4j_task = asyncio.to_thread(self._retrieve_from_neo4j, parsed_query)
         if self.milvus and self.embedding_generator:
-            results['milvus_results'] = self._retrieve_from_milvus(
+            milvus_task = asyncio.to_thread(
+                self._retrieve_from_milvus,
                 parsed_query,
                 top_k=top_k,
                 similarity_threshold=similarity_threshold
             )
+            neo4j_results, milvus_results = await asyncio.gather(neo4j_task, milvus_task)
+        else:
+            neo4j_results, milvus_results = await neo4j_task, []
         
-        return results
+        return {
+            'neo4j_results': neo4j_results,
+            'milvus_results': milvus_results,
+            'query_intent': parsed_query.get('intent', 'general')
+        }
     
     def _retrieve_from_neo4j(self, parsed_query: Dict) -> Dict:
         """Retrieve structured data from Neo4j."""
@@ -139,8 +191,8 @@ class Retriever:
             return {
                 'parts_town_number': parts_town_number,
                 'properties': dict(part_node),
-                'models': [m for m in record['models'] if m],
-                'pdf_urls': [url for url in record['pdf_urls'] if url]
+                'models': sorted(m for m in record['models'] if m),
+                'pdf_urls': sorted(url for url in record['pdf_urls'] if url)
             }
         return None
     
@@ -166,8 +218,8 @@ class Retriever:
             return {
                 'manufacturer_number': manufacturer_number,
                 'properties': dict(part_node),
-                'models': [m for m in record['models'] if m],
-                'pdf_urls': [url for url in record['pdf_urls'] if url]
+                'models': sorted(m for m in record['models'] if m),
+                'pdf_urls': sorted(url for url in record['pdf_urls'] if url)
             }
         return None
     
@@ -195,10 +247,11 @@ class Retriever:
         # If > 7 parts: show first 5 Parts Town #, then "and X more"
         limit = total_parts if total_parts <= 7 else 5
         
-        # Get Parts Town # for the parts we'll show
+        # Get Parts Town # for the parts we'll show (ingestion stores it as p.name)
         parts_query = """
         MATCH (m:Model {name: $model_name})-[:HAS_PART]->(p:Part)
-        RETURN p.`Parts Town #` as parts_town_number
+        RETURN coalesce(p.`Parts Town #`, p.name) as parts_town_number
+        ORDER BY parts_town_number
         LIMIT $limit
         """
         
@@ -235,6 +288,7 @@ class Retriever:
         RETURN p,
                collect(DISTINCT m.name) as models,
                collect(DISTINCT pdf.url) as pdf_urls
+        ORDER BY p.name
         LIMIT 10
         """
         
@@ -245,8 +299,8 @@ class Retriever:
             part_node = record['p']
             parts.append({
                 'properties': dict(part_node),
-                'models': [m for m in record['models'] if m],
-                'pdf_urls': [url for url in record['pdf_urls'] if url]
+                'models': sorted(m for m in record['models'] if m),
+                'pdf_urls': sorted(url for url in record['pdf_urls'] if url)
             })
         
         return parts
@@ -260,6 +314,7 @@ class Retriever:
         OPTIONAL MATCH (m)-[:HAS_PART]->(p:Part)
         RETURN m,
                collect(DISTINCT p.name) as parts
+        ORDER BY m.name
         LIMIT 10
         """
         
@@ -270,7 +325,7 @@ class Retriever:
             model_node = record['m']
             models.append({
                 'properties': dict(model_node),
-                'parts': [p for p in record['parts'] if p]
+                'parts': sorted(p for p in record['parts'] if p)
             })
         
         return models
@@ -285,7 +340,8 @@ class Retriever:
             if model_name:
                 query = """
                 MATCH (m:Model {name: $model_name})-[:HAS_PART]->(p:Part)
-                RETURN p.name as part_name, p.`Parts Town #` as parts_town_number
+                RETURN p.name as part_name, coalesce(p.`Parts Town #`, p.name) as parts_town_number
+                ORDER BY p.name
                 LIMIT 20
                 """
                 result = self.neo4j.execute_query(query, {'model_name': model_name})
@@ -382,7 +438,7 @@ class Retriever:
                 })
         
         # Sort by distance (lower is better) and return top_k results
-        filtered_results.sort(key=lambda x: x['distance'])
+        filtered_results.sort(key=_hit_order)
         
         print(f"  ✓ Found {len(filtered_results)} relevant chunks (max distance: {max_distance})")
         if filtered_results:
@@ -415,7 +471,7 @@ class Retriever:
                         'distance': distance
                     })
             
-            filtered_results.sort(key=lambda x: x['distance'])
+            filtered_results.sort(key=_hit_order)
             print(f"  ✓ Broader search found {len(filtered_results)} relevant chunks")
         
         return filtered_results[:top_k]
@@ -0,0 +1,103 @@
+"""
+CSV loading shared by the Neo4j and Milvus ingestion pipelines.
+"""
+import pandas as pd
+
+# Cells read as missing, on both the pyarrow and the C path (pandas' defaults)
+_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+# read_csv options of the C-engine (text) path
+_TEXT_OPTIONS = {'dtype': str, 'na_values': _NA_VALUES, 'keep_default_na': False}
+
+
+def reduce_mem_usage(df: pd.DataFrame, max_unique_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Shrink a DataFrame in place by turning repetitive string columns into categories.
+    
+    read_csv and iter_csv_chunks read every column as text, so string
+    columns are the only ones there are to shrink.
+    
+    Args:
+        df: DataFrame to shrink
+        max_unique_ratio: Convert string columns whose unique/total ratio is below this
+        
+    Returns:
+        The same DataFrame
+    """
+    num_rows = len(df)
+    if not num_rows:
+        return df
+    
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_string_dtype(series) or pd.api.types.is_object_dtype(series):
+            if series.nunique() / num_rows < max_unique_ratio:
+                df[col] = series.astype('category')
+    return df
+
+
+def read_csv(csv_path: str, memory_optimize: bool = False) -> pd.DataFrame:
+    """
+    Read a CSV file with the multithreaded pyarrow parser into Arrow-backed string columns.
+    
+    Every column is read as text, exactly as iter_csv_chunks reads it, so a
+    value is stored the same way whether the file is loaded whole or
+    streamed ("007" stays "007", "1.10" stays "1.10"). Falls back to the C
+    engine if pyarrow is unavailable, can't parse the file, or the header
+    repeats a column name.
+    
+    Args:
+        csv_path: Path to CSV file
+        memory_optimize: Apply ``reduce_mem_usage`` after reading
+        
+    Returns:
+        DataFrame with CSV data
+    """
+    try:
+        df = _read_csv_arrow(csv_path)
+    except (ImportError, ValueError):
+        # pyarrow missing, ArrowInvalid (a ValueError) on malformed input, or duplicate headers
+        df = pd.read_csv(csv_path, engine='c', low_memory=False, **_TEXT_OPTIONS)
+    
+    if memory_optimize:
+        reduce_mem_usage(df)
+    return df
+
+
+def _read_csv_arrow(csv_path: str) -> pd.DataFrame:
+    """Read every column as an Arrow string with pyarrow.csv (pandas' pyarrow engine re-parses numbers)."""
+    from pyarrow import csv as pa_csv, string
+    
+    # The streaming reader only parses the first block to get the header
+    names = pa_csv.open_csv(csv_path).schema.names
+    if len(set(names)) != len(names):
+        # pyarrow keeps duplicate headers; the C engine renames them
+        # ("PDF Link", "PDF Link.1") like iter_csv_chunks does
+        raise ValueError(f"Duplicate column names in {csv_path}")
+    table = pa_csv.read_csv(csv_path, convert_options=pa_csv.ConvertOptions(
+        column_types={name: string() for name in names},
+        null_values=_NA_VALUES,
+        strings_can_be_null=True
+    ))
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def iter_csv_chunks(csv_path: str, chunksize: int = 50000):
+    """
+    Stream a CSV file as DataFrames of at most ``chunksize`` rows.
+    
+    Every column is read as text, as in read_csv: pandas would otherwise
+    infer dtypes per chunk, so a column could come back as int in one chunk
+    and float in the next, and the same value would be stored as "3" or
+    "3.0" depending on where it falls in the file.
+    
+    Args:
+        csv_path: Path to CSV file
+        chunksize: Maximum number of rows per chunk
+        
+    Returns:
+        Iterator of DataFrames
+    """
+    return pd.read_csv(csv_path, chunksize=chunksize, engine='c', low_memory=False, **_TEXT_OPTIONS)
@@ -51,15 +51,16 @@ class EmbeddingGenerator:
         # Reduce batch size for very large batches to avoid memory/Metal issues
         # Metal has a 2^32 byte limit (~4GB), so we need smaller batches
         num_texts = len(texts)
-        if num_texts > 1000:
+        on_mac = platform.system() == "Darwin"
+        if on_mac and num_texts > 1000:
             # For large batches, use smaller batch size
             batch_size = min(batch_size, 16)
-        elif num_texts > 500:
+        elif on_mac and num_texts > 500:
             batch_size = min(batch_size, 24)
         
         # Process in chunks if batch is very large to avoid Metal array size issues
         max_chunk_size = 500  # Process max 500 texts at a time
-        if num_texts > max_chunk_size:
+        if on_mac and num_texts > max_chunk_size:
             print(f"  Processing {num_texts} texts in chunks of {max_chunk_size}...")
             all_embeddings = []
             for i in range(0, num_texts, max_chunk_size):
@@ -74,12 +75,13 @@ class EmbeddingGenerator:
             embeddings = np.vstack(all_embeddings)
         else:
             # Generate embeddings for smaller batches
-            embeddings = self.model.encode(
-                texts,
-                batch_size=batch_size,
-                show_progress_bar=len(texts) > 10,
-                convert_to_numpy=True
-            )
+            with torch.inference_mode():
+                embeddings = self.model.encode(
+                    texts,
+                    batch_size=batch_size,
+                    show_progress_bar=len(texts) > 10,
+                    convert_to_numpy=True
+                )
         
         return embeddings
     
@@ -7,6 +7,15 @@ from pathlib import Path
 import re
 
 
+# Metadata every chunk carries (page_number and chunk_index are set per chunk),
+# so consumers can index it directly instead of using .get() with defaults
+CHUNK_METADATA_DEFAULTS = {
+    'parts_town_number': '',
+    'manufacturer_number': '',
+    'pdf_url': '',
+}
+
+
 class PDFProcessor:
     """Handle PDF text extraction and chunking."""
     
@@ -92,7 +101,7 @@ class PDFProcessor:
             List of chunk dictionaries with text and metadata
         """
         chunks = []
-        metadata = metadata or {}
+        metadata = {**CHUNK_METADATA_DEFAULTS, **(metadata or {})}
         
         # Split by sentences first
         sentences = re.split(r'(?<=[.!?])\s+', text)
@@ -183,3 +192,19 @@ class PDFProcessor:
             all_chunks.extend(page_chunks)
         
         return all_chunks
+
+
+def extract_and_chunk(pdf_path: Path, metadata: Dict, chunk_size: int = 800, chunk_overlap: int = 100) -> List[Dict[str, any]]:
+    """
+    Extract and chunk one PDF; module-level so it can run in a worker process.
+    
+    Args:
+        pdf_path: Path to PDF file
+        metadata: Base metadata to include in all chunks
+        chunk_size: Target chunk size in tokens (approximate)
+        chunk_overlap: Overlap between chunks in tokens
+        
+    Returns:
+        List of chunk dictionaries ready for embedding
+    """
+    return PDFProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap).process_pdf(pdf_path, metadata)